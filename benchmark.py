@@ -0,0 +1,461 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+import argparse
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+# Benchmark suite for the scanner pipeline. Every benchmark runs against a
+# synthetic bhavcopy + instrument master so no market data or token is needed.
+#
+#   python benchmark.py                 # run everything
+#   python benchmark.py render session  # run selected benchmarks
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, APP_DIR)
+
+import scanner
+
+
+def make_synthetic_market(n_symbols=200, n_expiries=2, n_strikes=21, seed=7):
+    # Returns (bhav_df, master_df) shaped like the NSE F&O bhavcopy and the
+    # Upstox NSE.json instrument master.
+    rng = np.random.default_rng(seed)
+    today = scanner.get_ist_now().replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+    expiries = [pd.Timestamp(today + timedelta(days=7 + 28 * i)) for i in range(n_expiries)]
+
+    bhav_rows = []
+    master_rows = []
+    for s in range(n_symbols):
+        # Every 10th underlying is hyphenated, like BAJAJ-AUTO
+        symbol = f"SYM{s:04d}" if s % 10 else f"SYM-{s:04d}"
+        spot = float(rng.uniform(100, 5000))
+        step = max(1.0, round(spot * 0.01))
+        for expiry in expiries:
+            fut_price = round(spot * float(rng.uniform(0.99, 1.01)), 2)
+            bhav_rows.append({
+                'FinInstrmTp': 'STF', 'TckrSymb': symbol, 'XpryDt': expiry.strftime('%Y-%m-%d'),
+                'ClsPric': fut_price, 'StrkPric': np.nan, 'OptnTp': np.nan,
+                'HghPric': fut_price * 1.02, 'LwPric': fut_price * 0.98, 'LastPric': fut_price,
+                'FinInstrmNm': f"{symbol}FUT",
+            })
+            atm = round(fut_price / step) * step
+            for k in range(-(n_strikes // 2), n_strikes // 2 + 1):
+                strike = atm + k * step
+                for opt in ('CE', 'PE'):
+                    close = round(float(rng.uniform(1, spot * 0.05)), 2)
+                    bhav_rows.append({
+                        'FinInstrmTp': 'STO', 'TckrSymb': symbol, 'XpryDt': expiry.strftime('%Y-%m-%d'),
+                        'ClsPric': close, 'StrkPric': strike, 'OptnTp': opt,
+                        'HghPric': close * 1.2, 'LwPric': close * 0.8, 'LastPric': close,
+                        'FinInstrmNm': f"{symbol}{strike:g}{opt}",
+                    })
+                    master_rows.append({
+                        'segment': 'NSE_FO',
+                        'instrument_key': f"NSE_FO|{symbol}{expiry:%y%m%d}{strike:g}{opt}",
+                        'trading_symbol': f"{symbol} {strike:g} {opt} {expiry:%d %b %y}",
+                        'underlying_symbol': symbol,
+                        'strike_price': strike,
+                        'instrument_type': opt,
+                        'expiry': int(expiry.timestamp() * 1000),
+                    })
+
+    return pd.DataFrame(bhav_rows), pd.DataFrame(master_rows)
+
+
+def make_dhan_scrip_master(master_df):
+    # Dhan api-scrip-master.csv rows for the same contracts as master_df
+    expiry = pd.to_datetime(master_df['expiry'], unit='ms')
+    return pd.DataFrame({
+        'SEM_EXM_EXCH_ID': 'NSE',
+        'SEM_SEGMENT': 'D',
+        'SEM_SMST_SECURITY_ID': np.arange(40000, 40000 + len(master_df)),
+        'SEM_INSTRUMENT_NAME': 'OPTSTK',
+        'SEM_TRADING_SYMBOL': master_df['underlying_symbol'] + '-' + expiry.dt.strftime('%b%Y') + '-'
+                              + master_df['strike_price'].map('{:g}'.format) + '-' + master_df['instrument_type'],
+        'SEM_EXPIRY_DATE': expiry.dt.strftime('%Y-%m-%d 14:30:00'),
+        'SEM_STRIKE_PRICE': master_df['strike_price'],
+        'SEM_OPTION_TYPE': master_df['instrument_type'],
+    })
+
+
+def synthetic_ltp(keys, seed=11):
+    # LTPs spread around the trigger so every colour band is populated
+    rng = np.random.default_rng(seed)
+    return {k: float(v) for k, v in zip(keys, rng.uniform(1, 400, len(keys)))}
+
+
+def timed(fn, repeat):
+    wall = []
+    cpu = []
+    for _ in range(repeat):
+        w0, c0 = time.perf_counter(), time.process_time()
+        fn()
+        wall.append(time.perf_counter() - w0)
+        cpu.append(time.process_time() - c0)
+    return np.array(wall) * 1000, np.array(cpu) * 1000
+
+
+def report(name, wall_ms, cpu_ms=None, extra=''):
+    line = f"{name:<36} p50 {np.percentile(wall_ms, 50):8.2f} ms  p95 {np.percentile(wall_ms, 95):8.2f} ms"
+    if cpu_ms is not None:
+        line += f"  cpu {np.mean(cpu_ms):8.2f} ms"
+    if extra:
+        line += f"  {extra}"
+    print(line)
+
+
+def _render_styler(frame):
+    import streamlit as st
+
+    def color_change(val):
+        if isinstance(val, (int, float)):
+            if val >= 100:
+                return 'background-color: darkgreen; color: white'
+            elif val >= 90:
+                return 'background-color: lightgreen; color: black'
+        return ''
+
+    cols = ['Symbol', 'StrikePrice', 'Trigger', 'ltp', 'change %']
+    st.dataframe(
+        frame[cols].style
+        .map(color_change, subset=['change %'])
+        .format({'change %': '{:.2f}%', 'Trigger': '{:.2f}', 'ltp': '{:.2f}', 'StrikePrice': '{:.2f}'})
+        .set_properties(**{'font-weight': '600', 'text-align': 'center', 'font-size': '16px'}),
+        hide_index=True, use_container_width=True, height=1800
+    )
+
+
+def _render_native(frame):
+    import streamlit as st
+    import scanner
+
+    st.dataframe(
+        frame[scanner.DISPLAY_COLS],
+        column_config={
+            'Band': st.column_config.TextColumn(' ', width='small'),
+            'StrikePrice': st.column_config.NumberColumn('StrikePrice', format='%.2f'),
+            'Trigger': st.column_config.NumberColumn('Trigger', format='%.2f'),
+            'ltp': st.column_config.NumberColumn('ltp', format='%.2f'),
+            'change %': st.column_config.NumberColumn('change %', format='%.2f%%'),
+        },
+        hide_index=True, use_container_width=True, height=1800
+    )
+
+
+def bench_render(args):
+    # Table render cost: pandas Styler with per-cell colouring vs native column
+    # config with a precomputed band column. Payload is the serialized element.
+    from streamlit.testing.v1 import AppTest
+
+    bhav, master = make_synthetic_market(args.symbols)
+    master['expiry_dt'] = pd.to_datetime(master['expiry'], unit='ms').dt.normalize()
+    path = os.path.join(tempfile.mkdtemp(), 'bhav.csv')
+    bhav.to_csv(path, index=False)
+    atm = scanner.process_bhavcopy(path, master)
+    ltp = synthetic_ltp(atm['instrument_key'].tolist())
+    calls, _, _ = scanner.build_option_chain(atm.copy(), ltp, 'Monthly')
+    print(f"-- render ({len(calls)} rows per table)")
+
+    for name, renderer in (('styler', _render_styler), ('native', _render_native)):
+        def run():
+            at = AppTest.from_function(renderer, args=(calls,))
+            at.run(timeout=60)
+            return at
+        at = run()
+        payload = at.dataframe[0].proto.ByteSize()
+        wall, cpu = timed(run, args.repeat)
+        report(f"table render [{name}]", wall, cpu, f"payload {payload / 1024:8.1f} KiB")
+
+
+def prepare_workdir(n_symbols):
+    # Temp working directory laid out like a deployment: NSE.json + data/*.csv
+    workdir = tempfile.mkdtemp(prefix='scanner-bench-')
+    bhav, master = make_synthetic_market(n_symbols)
+    master.to_json(os.path.join(workdir, 'NSE.json'), orient='records')
+    os.makedirs(os.path.join(workdir, 'data'))
+    # Admin view: an empty secrets file means no UPSTOX_ACCESS_TOKEN
+    os.makedirs(os.path.join(workdir, '.streamlit'))
+    open(os.path.join(workdir, '.streamlit', 'secrets.toml'), 'w').close()
+    for name in ('monthly', 'weekly', 'intraday'):
+        bhav.to_csv(os.path.join(workdir, 'data', f'{name}.csv'), index=False)
+    return workdir
+
+
+def bench_session(args):
+    # Full per-session render time of app.py (one script run, no token).
+    from streamlit.testing.v1 import AppTest
+
+    workdir = prepare_workdir(args.symbols)
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        print(f"-- session ({args.symbols} symbols)")
+        for tab in ('Monthly', 'Weekly', 'Intraday'):
+            def run():
+                at = AppTest.from_file(os.path.join(APP_DIR, 'app.py'), default_timeout=120)
+                at.session_state['active_tab'] = tab
+                at.run()
+                return at
+            at = run()
+            payload = sum(df.proto.ByteSize() for df in at.dataframe)
+            wall, cpu = timed(run, args.repeat)
+            report(f"session render [{tab}]", wall, cpu, f"payload {payload / 1024:8.1f} KiB")
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def bench_delta(args):
+    # Bytes and serialization time per refresh: full table vs delta push when
+    # only a fraction of LTPs moved since the previous refresh.
+    import json
+    import delta_table
+
+    bhav, master = make_synthetic_market(args.symbols)
+    master['expiry_dt'] = pd.to_datetime(master['expiry'], unit='ms').dt.normalize()
+    path = os.path.join(tempfile.mkdtemp(), 'bhav.csv')
+    bhav.to_csv(path, index=False)
+    atm = scanner.process_bhavcopy(path, master)
+    keys = atm['instrument_key'].tolist()
+    ltp = synthetic_ltp(keys)
+    calls, _, _ = scanner.build_option_chain(atm.copy(), ltp, 'Monthly')
+    print(f"-- delta ({len(calls)} rows per table)")
+
+    rng = np.random.default_rng(3)
+    for moved in (0.01, 0.05, 0.25):
+        moved_keys = rng.choice(keys, max(1, int(len(keys) * moved)), replace=False)
+        ltp_next = dict(ltp)
+        for k in moved_keys:
+            ltp_next[k] = ltp[k] * 1.01
+        calls_next, _, _ = scanner.build_option_chain(atm.copy(), ltp_next, 'Monthly')
+
+        prev = delta_table.snapshot_frame(calls)
+        results = {}
+        for mode in ('full', 'delta'):
+            def run():
+                curr = delta_table.snapshot_frame(calls_next)
+                base = None if mode == 'full' else 1
+                results[mode] = json.dumps(delta_table.build_payload(prev, curr, 2, base), separators=(',', ':'))
+            wall, cpu = timed(run, args.repeat)
+            report(f"refresh {moved:>4.0%} moved [{mode}]", wall, cpu, f"bytes {len(results[mode]):8d}")
+
+
+def bench_ticks(args):
+    # Tick store: append cost per poll (all ATM keys) and per-key range query
+    # latency over a full recorded session.
+    import tick_store
+    from scanner import IST
+    from datetime import datetime
+
+    keys = [f"NSE_FO|{i}" for i in range(args.symbols * 2)]
+    polls = 6 * 60 * 4  # 15-second polls over a trading day
+    start = datetime(2026, 1, 29, 9, 15, tzinfo=IST)
+    workdir = tempfile.mkdtemp(prefix='scanner-ticks-')
+    old_dir = tick_store.TICKS_DIR
+    tick_store.TICKS_DIR = workdir
+    try:
+        rng = np.random.default_rng(5)
+        prices = rng.uniform(1, 400, (polls, len(keys)))
+        print(f"-- ticks ({len(keys)} keys x {polls} polls)")
+        wall = []
+        for i in range(polls):
+            batch = dict(zip(keys, prices[i].tolist()))
+            t0 = time.perf_counter()
+            tick_store.append_ticks(batch, ts=start + timedelta(seconds=15 * i))
+            wall.append(time.perf_counter() - t0)
+        report("append (one poll)", np.array(wall) * 1000)
+
+        window = (start + timedelta(hours=1), start + timedelta(hours=2))
+        wall, cpu = timed(lambda: tick_store.query_ticks(keys[7], '2026-01-29', *window), args.repeat)
+        report("query one key, 1h window", wall, cpu)
+        wall, cpu = timed(lambda: tick_store.query_ticks(keys[7], '2026-01-29'), args.repeat)
+        report("query one key, full day", wall, cpu)
+    finally:
+        tick_store.TICKS_DIR = old_dir
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def bench_store(args):
+    # LTP cache write cost: the old read-modify-write of ltp_cache.json vs a
+    # row-level upsert into the SQLite store, as the cache grows.
+    import json
+    import store
+
+    workdir = tempfile.mkdtemp(prefix='scanner-store-')
+    json_path = os.path.join(workdir, 'ltp_cache.json')
+    store.connect(os.path.join(workdir, 'state.db'))
+    try:
+        rng = np.random.default_rng(9)
+        print("-- store (upsert 50 changed LTPs)")
+        for size in (1000, 10000, 50000):
+            cache = {f"NSE_FO|{i}": float(v) for i, v in enumerate(rng.uniform(1, 400, size))}
+            with open(json_path, 'w') as f:
+                json.dump(cache, f)
+            store.upsert_ltps(cache)
+            changed = {f"NSE_FO|{i}": float(v) for i, v in enumerate(rng.uniform(1, 400, 50))}
+
+            def json_write():
+                with open(json_path, 'r') as f:
+                    current = json.load(f)
+                current.update(changed)
+                with open(json_path, 'w') as f:
+                    json.dump(current, f)
+
+            wall, cpu = timed(json_write, args.repeat)
+            report(f"json rewrite [{size} keys]", wall, cpu)
+            wall, cpu = timed(lambda: store.upsert_ltps(changed), args.repeat)
+            report(f"sqlite upsert [{size} keys]", wall, cpu)
+    finally:
+        store.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def bench_quotes(args):
+    # Refresh fetch latency for all ATM keys when the primary quote API has
+    # occasional stalls: Upstox alone vs Upstox hedged to Dhan. Both APIs are
+    # local stand-ins.
+    import instruments
+    import quotes
+    from mock_upstream import MockUpstream
+
+    bhav, master = make_synthetic_market(args.symbols)
+    master['expiry_dt'] = pd.to_datetime(master['expiry'], unit='ms').dt.normalize()
+    workdir = tempfile.mkdtemp(prefix='scanner-quotes-')
+    bhav_path = os.path.join(workdir, 'bhav.csv')
+    scrip_path = os.path.join(workdir, 'api-scrip-master.csv')
+    bhav.to_csv(bhav_path, index=False)
+    make_dhan_scrip_master(master).to_csv(scrip_path, index=False)
+    index = instruments.InstrumentMaster()
+    index.apply(master)
+    keys = scanner.process_bhavcopy(bhav_path, master)['instrument_key'].tolist()
+
+    upstox = MockUpstream(latency_ms=20, jitter_ms=10, stall_rate=0.03, stall_ms=1500, seed=1).start()
+    dhan = MockUpstream(latency_ms=60, jitter_ms=20, seed=2).start()
+    routers = {
+        'upstox only': quotes.QuoteRouter([quotes.UpstoxProvider('bench', upstox.upstox_ltp_url)]),
+        'hedged': quotes.QuoteRouter([
+            quotes.UpstoxProvider('bench', upstox.upstox_ltp_url),
+            quotes.DhanProvider('bench', 'bench', scrip_path, dhan.dhan_ltp_url, master=index),
+        ], hedge_after_ms=200),
+    }
+    try:
+        print(f"-- quotes ({len(keys)} keys, primary stalls 1.5 s on 3% of requests)")
+        for name, router in routers.items():
+            got = []
+            wall, cpu = timed(lambda: got.append(len(router.fetch(keys))), args.repeat * 10)
+            report(f"refresh fetch [{name}]", wall, cpu,
+                   f"p99 {np.percentile(wall, 99):8.2f} ms  complete {np.mean(np.array(got) == len(keys)):.0%}")
+        for h in quotes.health_report():
+            print(f"  {h['name']:<8} requests {h['requests']:5d}  failures {h['failures']:3d}  "
+                  f"ewma {h['latency_ms'] or 0:7.1f} ms")
+    finally:
+        for router in routers.values():
+            router.close()
+        upstox.stop()
+        dhan.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def bench_coldstart(args):
+    # First paint after a restart: a real server process per run, with one
+    # client-view session connecting as soon as /_stcore/health answers.
+    #   cold      plain `streamlit run`, no saved instrument index
+    #   artifact  plain `streamlit run`, instrument index saved by a prior run
+    #   warm      startup.py (warm-up before serving)
+    import asyncio
+    import loadtest
+    from mock_upstream import MockUpstream
+
+    mock = MockUpstream(latency_ms=50, jitter_ms=50).start()
+    workdir = loadtest.prepare_workdir(args.symbols)
+    artifact = os.path.join(workdir, 'data', 'instrument_index.pkl')
+    try:
+        print(f"-- coldstart ({args.symbols} symbols, client view, market hours)")
+        for mode in ('cold', 'artifact', 'warm'):
+            boot, paint = [], []
+            for _ in range(args.repeat):
+                if mode == 'cold' and os.path.exists(artifact):
+                    os.remove(artifact)
+                server = loadtest.ServerProcess(workdir, mock.upstox_ltp_url, '10:00', warm=(mode == 'warm'))
+                try:
+                    server.wait_ready(timeout=120)
+                    boot.append(time.perf_counter() - server.started)
+                    stats = loadtest.SessionStats()
+                    asyncio.run(loadtest.run_session(server.ws_url, stats, time.perf_counter() + 5))
+                    paint.append(stats.latencies[0] / 1000 if stats.latencies else np.nan)
+                finally:
+                    server.stop()
+            report(f"first paint [{mode}]", np.array(paint) * 1000, extra=f"server up after {np.median(boot):6.2f} s")
+    finally:
+        mock.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def bench_atm_select(args):
+    # What the app shards with SCANNER_WORKERS > 1: ATM selection from the
+    # bhavcopy (an ATM table rebuild on a new upload or day), in-process vs
+    # across worker processes, on a wide market (3 expiries, 41 strikes). The
+    # per-refresh steps are not sharded and not measured here.
+    import shards
+
+    bhav, _ = make_synthetic_market(args.symbols, n_expiries=3, n_strikes=41)
+    data = bhav.to_csv(index=False).encode()
+    cores = os.cpu_count() or 1
+    workers = [int(w) for w in args.workers.split(',')] if args.workers else \
+        [w for w in (1, 2, 4, 8, 16) if w <= cores] or [1]
+
+    print(f"-- atm_select ({args.symbols} symbols, {len(bhav)} bhavcopy rows, {cores} cores)")
+    expected = scanner.select_atm_rows(data).reset_index(drop=True)
+    wall, cpu = timed(lambda: scanner.select_atm_rows(data), args.repeat)
+    base = np.percentile(wall, 50)
+    report("ATM selection [in-process]", wall, cpu, f"{len(bhav) / base * 1000:10,.0f} rows/s")
+    first = None
+    for n in workers:
+        shards.warm(n)
+        got = shards.select_atm_rows(data, workers=n)
+        # Arrow parses floats correctly rounded, pandas' default parser can be
+        # off in the last bit: exact across worker counts, close to in-process
+        first = got if first is None else first
+        try:
+            pd.testing.assert_frame_equal(got, expected)
+            same = got.equals(first)
+        except AssertionError:
+            same = False
+        wall, cpu = timed(lambda: shards.select_atm_rows(data, workers=n), args.repeat)
+        p50 = np.percentile(wall, 50)
+        report(f"ATM selection [{n} workers]", wall, cpu,
+               f"{len(bhav) / p50 * 1000:10,.0f} rows/s  x{base / p50:5.2f}  "
+               f"{'identical' if same else 'MISMATCH'}{'  (oversubscribed)' if n > cores else ''}")
+    shards.shutdown()
+
+BENCHMARKS = {
+    'render': bench_render,
+    'session': bench_session,
+    'delta': bench_delta,
+    'ticks': bench_ticks,
+    'store': bench_store,
+    'quotes': bench_quotes,
+    'coldstart': bench_coldstart,
+    'atm_select': bench_atm_select,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scanner benchmark suite")
+    parser.add_argument('benchmarks', nargs='*', choices=[[]] + list(BENCHMARKS), default=[])
+    parser.add_argument('--symbols', type=int, default=200, help="Number of synthetic underlyings")
+    parser.add_argument('--repeat', type=int, default=5, help="Timed repetitions per benchmark")
+    parser.add_argument('--workers', default='', help="Comma-separated worker counts for `atm_select` (default: 1,2,4,.. up to the core count)")
+    args = parser.parse_args()
+
+    for name in args.benchmarks or list(BENCHMARKS):
+        BENCHMARKS[name](args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import os
+import json
+import time
+
+import pandas as pd
+import streamlit as st
+
+# Delta-based table push: the server remembers the last snapshot sent to each
+# session and ships only new/changed/removed rows. The browser component keeps
+# its own copy, applies the patch, and asks for a full resync if its version
+# does not match the patch base (remount, reconnect or dropped message).
+
+_FRONTEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'components', 'delta_table')
+_delta_table = None
+
+
+def _component():
+    # Declared on first use; the components API import is not needed on
+    # servers that only render st.dataframe
+    global _delta_table
+    if _delta_table is None:
+        import streamlit.components.v1 as components
+        _delta_table = components.declare_component('delta_table', path=_FRONTEND_DIR)
+    return _delta_table
+
+KEY_COL = 'instrument_key'
+TABLE_COLS = ['Symbol', 'StrikePrice', 'Trigger', 'ltp', 'change %']
+FORMATS = {
+    'StrikePrice': {'decimals': 2},
+    'Trigger': {'decimals': 2},
+    'ltp': {'decimals': 2},
+    'change %': {'decimals': 2, 'suffix': '%'},
+}
+
+DISPLAY_META = {
+    'formats': FORMATS,
+    'sort_by': 'change %',
+    'tie_break': 'Symbol',
+    'band_column': 'change %',
+    'band_strong': 100,
+    'band_near': 90,
+}
+
+
+def snapshot_frame(df, columns=TABLE_COLS):
+    # {instrument_key: [values as displayed]}. Numbers are rounded to the
+    # displayed 2 decimals so sub-display noise does not produce deltas, and
+    # NaN becomes None (valid JSON, and equal to itself when diffing).
+    cols = []
+    for c in columns:
+        series = df[c]
+        if pd.api.types.is_numeric_dtype(series):
+            series = series.round(2)
+        cols.append(series.astype(object).where(series.notna(), None).tolist())
+    return dict(zip(df[KEY_COL].tolist(), map(list, zip(*cols))))
+
+
+def diff_snapshots(prev, curr):
+    # Returns (changed_or_new_rows, removed_keys)
+    changed = [[k] + v for k, v in curr.items() if prev.get(k) != v]
+    removed = [k for k in prev if k not in curr]
+    return changed, removed
+
+
+def build_payload(prev, curr, version, base, columns=TABLE_COLS):
+    if prev is None or base is None:
+        return {
+            'version': version,
+            'base': None,
+            'columns': columns,
+            'rows': [[k] + v for k, v in curr.items()],
+        }
+    changed, removed = diff_snapshots(prev, curr)
+    return {
+        'version': version,
+        'base': base,
+        'upsert': changed,
+        'remove': removed,
+    }
+
+
+def delta_table(df, key, height=1800, columns=TABLE_COLS):
+    # Render df through the delta component. Returns per-refresh stats:
+    # mode ('full' / 'delta'), rows sent, payload bytes and serialization ms.
+    state = st.session_state.setdefault(f'_delta_state_{key}', {'version': 0, 'snapshot': None, 'resync': None})
+
+    # Component asked for a resync (its copy is out of step with ours)
+    ack = st.session_state.get(key)
+    if isinstance(ack, dict) and ack.get('resync') != state['resync']:
+        state['resync'] = ack.get('resync')
+        state['snapshot'] = None
+
+    t0 = time.perf_counter()
+    curr = snapshot_frame(df, columns)
+    base = state['version'] if state['snapshot'] is not None else None
+    payload = build_payload(state['snapshot'], curr, state['version'] + 1, base, columns)
+    if base is None:
+        # Display options only travel with full snapshots; the client keeps them
+        payload['meta'] = DISPLAY_META
+    size = len(json.dumps(payload, separators=(',', ':')))
+    serialize_ms = (time.perf_counter() - t0) * 1000
+
+    state['version'] = payload['version']
+    state['snapshot'] = curr
+
+    _component()(payload=payload, height=height, key=key, default=None)
+
+    sent = len(payload['rows']) if base is None else len(payload['upsert']) + len(payload['remove'])
+    return {
+        'mode': 'full' if base is None else 'delta',
+        'rows': sent,
+        'bytes': size,
+        'serialize_ms': serialize_ms,
+    }
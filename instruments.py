@@ -0,0 +1,211 @@
+import os
+import threading
+
+import pandas as pd
+
+from scanner import (
+    DATA_DIR, NSE_JSON_PATH, today_str, load_bhavcopy, bhavcopy_info,
+    read_nse_json, select_atm_rows, join_instruments,
+)
+
+# Process-wide instrument master (NSE_FO rows of NSE.json) and the ATM tables
+# built from it. A master refresh is applied as a diff against the current
+# index: expired contracts are dropped, new ones appended, and only the cached
+# ATM tables that reference a changed contract are re-joined. Nothing else is
+# invalidated, so live sessions keep serving cached tables during an update.
+#
+# ATM tables are cached per (tab, expiry index) and rebuilt from the bhavcopy
+# only when that tab's upload or the IST day changes. Every process picks up a
+# new NSE.json on its next access (by mtime), so one download updates them all.
+#
+# The parsed index is also saved to data/instrument_index.pkl, so a restarted
+# process loads it in milliseconds instead of re-parsing NSE.json.
+
+MASTER_COLUMNS = ['instrument_key', 'underlying_symbol', 'strike_price', 'instrument_type', 'expiry_dt']
+# Columns of an ATM row matched against a contract (symbol, strike, type, expiry)
+CONTRACT_COLUMNS = MASTER_COLUMNS[1:]
+ATM_CONTRACT_COLUMNS = ['TckrSymb', 'StrkPric', 'OptnTp', 'XpryDt']
+
+INDEX_ARTIFACT = os.path.join(DATA_DIR, 'instrument_index.pkl')
+
+# SCANNER_WORKERS > 1 selects ATM rows on the symbol-sharded process pool
+# (shards.py, imported only then)
+SHARDED = int(os.environ.get('SCANNER_WORKERS', '0') or 0) > 1
+
+
+def _contracts(frame, columns):
+    return pd.MultiIndex.from_frame(frame[columns], names=CONTRACT_COLUMNS)
+
+
+def _source_id(path):
+    stat = os.stat(path)
+    return [os.path.abspath(path), stat.st_mtime_ns, stat.st_size]
+
+
+def load_index_artifact(source, artifact=INDEX_ARTIFACT):
+    # The saved index for this exact NSE.json (see _source_id), or None
+    try:
+        saved = pd.read_pickle(artifact)
+        if saved['source'] == source:
+            return saved['frame']
+    except Exception:
+        pass
+    return None
+
+
+def save_index_artifact(source, frame, artifact=INDEX_ARTIFACT):
+    try:
+        os.makedirs(os.path.dirname(artifact) or '.', exist_ok=True)
+        tmp = f"{artifact}.{os.getpid()}.tmp"
+        pd.to_pickle({'source': source, 'frame': frame}, tmp)
+        os.replace(tmp, artifact)
+    except OSError:
+        pass
+
+
+def _select_atm_rows(bhav, target_expiry_index):
+    if SHARDED:
+        import shards
+        return shards.select_atm_rows(bhav, target_expiry_index)
+    return select_atm_rows(bhav, target_expiry_index)
+
+
+def diff_master(old, new):
+    # (added, removed) rows between two masters. A contract whose attributes
+    # changed under the same instrument_key shows up in both.
+    both = pd.merge(old, new, on=MASTER_COLUMNS, how='outer', indicator=True)
+    added = both.loc[both['_merge'] == 'right_only', MASTER_COLUMNS]
+    removed = both.loc[both['_merge'] == 'left_only', MASTER_COLUMNS]
+    return added.reset_index(drop=True), removed.reset_index(drop=True)
+
+
+class InstrumentMaster:
+    def __init__(self, path=NSE_JSON_PATH):
+        self.path = path
+        self.frame = pd.DataFrame(columns=MASTER_COLUMNS)
+        self.version = 0
+        self.mtime = None
+        self._lock = threading.RLock()
+        self._sync_lock = threading.Lock()  # one parse at a time
+        self._atm = {}  # (tab, expiry_index) -> {'source', 'rows', 'contracts', 'table'}
+
+    @property
+    def empty(self):
+        return self.frame.empty
+
+    def sync(self):
+        # Apply NSE.json if it changed on disk since the last sync. Returns the
+        # refresh summary, or None when already current. The parse runs
+        # outside self._lock, and once an index is loaded other callers don't
+        # wait for a refresh in progress: they keep the current one.
+        try:
+            source = _source_id(self.path)
+        except OSError:
+            return None
+        if source[1] == self.mtime:
+            return None
+        if not self._sync_lock.acquire(blocking=self.version == 0):
+            return None
+        try:
+            if source[1] == self.mtime:
+                return None
+            new_df = load_index_artifact(source) if self.version == 0 else None
+            from_artifact = new_df is not None
+            if not from_artifact:
+                new_df = read_nse_json(self.path)
+            summary = self.apply(new_df)
+            self.mtime = source[1]
+            if not from_artifact:
+                save_index_artifact(source, self.frame)
+            return summary
+        finally:
+            self._sync_lock.release()
+
+    def apply(self, new_df):
+        # Update the index from a freshly parsed master. The diff is computed
+        # against a snapshot; self._lock is only held to swap it in (and
+        # redone if another apply swapped first).
+        new = new_df[MASTER_COLUMNS].drop_duplicates('instrument_key', keep='last')
+        while True:
+            with self._lock:
+                frame, version = self.frame, self.version
+            if version == 0:
+                added, removed = new, new.iloc[:0]
+                frame = new.reset_index(drop=True)
+            else:
+                added, removed = diff_master(frame, new)
+                if not removed.empty:
+                    frame = frame[~frame['instrument_key'].isin(removed['instrument_key'])]
+                if not added.empty:
+                    frame = pd.concat([frame, added], ignore_index=True)
+            if added.empty and removed.empty and version:
+                return {'added': 0, 'removed': 0, 'invalidated': 0, 'version': version}
+            changed = _contracts(added, CONTRACT_COLUMNS).append(_contracts(removed, CONTRACT_COLUMNS))
+
+            with self._lock:
+                if self.version != version:
+                    continue
+                invalidated = 0
+                for entry in self._atm.values():
+                    if entry['table'] is not None and entry['contracts'].isin(changed).any():
+                        entry['table'] = None
+                        invalidated += 1
+
+                # Readers hold a reference to the previous frame; swap, don't mutate
+                self.frame = frame
+                self.version += 1
+                return {'added': len(added), 'removed': len(removed),
+                        'invalidated': invalidated, 'version': self.version}
+
+    # Where a tab's bhavcopy comes from: the store (replay.py overrides these)
+    def bhavcopy_info(self, tab):
+        return bhavcopy_info(tab)
+
+    def load_bhavcopy(self, tab):
+        return load_bhavcopy(tab)
+
+    def atm_table(self, tab, target_expiry_index=0):
+        # The tab's ATM table joined to the current master (a copy; callers
+        # are free to add columns). Empty when no bhavcopy is stored.
+        info = self.bhavcopy_info(tab)
+        if info is None:
+            return pd.DataFrame()
+        key = (tab, target_expiry_index)
+        source = (info[1], today_str())
+
+        with self._lock:
+            entry = self._atm.get(key)
+            if entry is not None and entry['source'] == source and entry['table'] is not None:
+                return entry['table'].copy()
+            rows = entry['rows'] if entry is not None and entry['source'] == source else None
+            frame = self.frame
+
+        if rows is None:
+            rows = _select_atm_rows(self.load_bhavcopy(tab), target_expiry_index)
+            if rows.empty:
+                # Not cached, so the reason is reported on every refresh
+                return pd.DataFrame()
+        table = join_instruments(rows, frame)
+
+        with self._lock:
+            # A refresh that landed meanwhile leaves the table to be re-joined
+            self._atm[key] = {
+                'source': source,
+                'rows': rows,
+                'contracts': _contracts(rows, ATM_CONTRACT_COLUMNS),
+                'table': table if frame is self.frame else None,
+            }
+        return table.copy()
+
+
+_masters = {}
+_masters_lock = threading.Lock()
+
+
+def get_master(path=NSE_JSON_PATH):
+    # One shared master per NSE.json path in this process
+    with _masters_lock:
+        master = _masters.get(path)
+        if master is None:
+            master = _masters[path] = InstrumentMaster(path)
+        return master
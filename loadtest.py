@@ -0,0 +1,340 @@
+import os
+import sys
+import json
+import time
+import glob
+import socket
+import shutil
+import tempfile
+import asyncio
+import argparse
+import threading
+import subprocess
+
+import numpy as np
+
+# Concurrent-session load test for the client view. For each N in --sessions
+# it starts a fresh Streamlit server (client view: token in secrets,
+# auto-refresh every 15 s) against a local mock Upstox endpoint, connects N
+# simulated browser sessions over the Streamlit websocket and reports:
+#
+#   - refresh latency percentiles (rerun request -> script_finished)
+#   - server CPU % and RSS growth per session (from /proc)
+#   - upstream LTP requests
+#   - failed reads of the shared state by a concurrent reader
+#
+#   pip install -r requirements-dev.txt
+#   python loadtest.py --sessions 1,10,25,50 --duration 60
+#
+# Sessions behave like the browser: one full run on connect, then the
+# auto_rerun schedule the server hands out for each fragment.
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, APP_DIR)
+
+from mock_upstream import MockUpstream
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def prepare_workdir(n_symbols, source=None):
+    # Client-view deployment in a temp dir: secrets with a token, NSE.json and
+    # data/*.csv (synthetic, or copied from an existing deployment dir)
+    import benchmark
+
+    if source:
+        workdir = tempfile.mkdtemp(prefix='scanner-load-')
+        shutil.copy(os.path.join(source, 'NSE.json'), workdir)
+        shutil.copytree(os.path.join(source, 'data'), os.path.join(workdir, 'data'))
+        os.makedirs(os.path.join(workdir, '.streamlit'), exist_ok=True)
+    else:
+        workdir = benchmark.prepare_workdir(n_symbols)
+    with open(os.path.join(workdir, '.streamlit', 'secrets.toml'), 'w') as f:
+        f.write('UPSTOX_ACCESS_TOKEN = "loadtest"\n')
+    return workdir
+
+
+class ServerProcess:
+    def __init__(self, workdir, upstream_url, fake_time, warm=False):
+        self.port = free_port()
+        env = dict(os.environ, UPSTOX_LTP_URL=upstream_url)
+        if fake_time:
+            env['SCANNER_FAKE_TIME'] = fake_time
+        self.log = open(os.path.join(workdir, 'server.log'), 'w')
+        # warm: boot through startup.py (warm-up before serving)
+        launcher = [os.path.join(APP_DIR, 'startup.py')] if warm else \
+            ['-m', 'streamlit', 'run', os.path.join(APP_DIR, 'app.py')]
+        self.started = time.perf_counter()
+        self.proc = subprocess.Popen(
+            [
+                sys.executable, *launcher,
+                '--server.headless', 'true',
+                '--server.port', str(self.port),
+                '--server.fileWatcherType', 'none',
+                '--browser.gatherUsageStats', 'false',
+            ],
+            cwd=workdir, env=env, stdout=self.log, stderr=subprocess.STDOUT
+        )
+
+    @property
+    def ws_url(self):
+        return f"ws://127.0.0.1:{self.port}/_stcore/stream"
+
+    def wait_ready(self, timeout=60):
+        import requests
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            try:
+                if requests.get(f"http://127.0.0.1:{self.port}/_stcore/health", timeout=1).status_code == 200:
+                    return
+            except Exception:
+                pass
+            if self.proc.poll() is not None:
+                break
+            time.sleep(0.2)
+        raise RuntimeError(f"Streamlit server did not start (see {self.log.name})")
+
+    def cpu_seconds(self):
+        # utime + stime from /proc (Linux); None elsewhere
+        try:
+            with open(f"/proc/{self.proc.pid}/stat") as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+        except Exception:
+            return None
+
+    def rss_mb(self):
+        try:
+            with open(f"/proc/{self.proc.pid}/status") as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        return int(line.split()[1]) / 1024
+        except Exception:
+            pass
+        return None
+
+    def stop(self):
+        self.proc.terminate()
+        try:
+            self.proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+        self.log.close()
+
+
+class SessionStats:
+    def __init__(self):
+        self.latencies = []
+        self.bytes = 0
+        self.messages = 0
+        self.runs = 0
+        self.errors = 0
+
+
+def _rerun_msg(fragment_id='', auto=False):
+    from streamlit.proto.BackMsg_pb2 import BackMsg
+    msg = BackMsg()
+    msg.rerun_script.query_string = ''
+    msg.rerun_script.page_script_hash = ''
+    msg.rerun_script.is_auto_rerun = auto
+    if fragment_id:
+        msg.rerun_script.fragment_id = fragment_id
+    msg.rerun_script.widget_states.SetInParent()
+    return msg.SerializeToString()
+
+
+async def run_session(url, stats, stop_at):
+    import websockets
+    from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+    pending = []       # send times of reruns awaiting script_finished
+    schedules = {}     # fragment_id -> auto-rerun task
+
+    async def auto_rerun(ws, fragment_id, interval):
+        while True:
+            await asyncio.sleep(interval)
+            pending.append(time.perf_counter())
+            await ws.send(_rerun_msg(fragment_id, auto=True))
+
+    try:
+        async with websockets.connect(url, subprotocols=['streamlit'], max_size=None, open_timeout=30) as ws:
+            pending.append(time.perf_counter())
+            await ws.send(_rerun_msg())
+            while time.perf_counter() < stop_at:
+                try:
+                    data = await asyncio.wait_for(ws.recv(), timeout=max(0.1, stop_at - time.perf_counter()))
+                except asyncio.TimeoutError:
+                    break
+                stats.bytes += len(data)
+                stats.messages += 1
+                msg = ForwardMsg()
+                msg.ParseFromString(data)
+                kind = msg.WhichOneof('type')
+                if kind == 'script_finished':
+                    stats.runs += 1
+                    if pending:
+                        stats.latencies.append((time.perf_counter() - pending.pop(0)) * 1000)
+                elif kind == 'auto_rerun':
+                    fid = msg.auto_rerun.fragment_id
+                    if fid not in schedules:
+                        schedules[fid] = asyncio.create_task(auto_rerun(ws, fid, msg.auto_rerun.interval))
+                elif kind == 'stop_auto_rerun':
+                    # Matches the frontend: cancel every schedule on stop
+                    for task in schedules.values():
+                        task.cancel()
+                    schedules.clear()
+                elif kind == 'delta' and msg.delta.new_element.WhichOneof('type') == 'exception':
+                    stats.errors += 1
+    except Exception:
+        stats.errors += 1
+    finally:
+        for task in schedules.values():
+            task.cancel()
+
+
+class StateWatcher(threading.Thread):
+    # Concurrent reader of the shared state (data/state.db, plus any legacy
+    # data/*.json files); counts reads that fail (torn writes, lock timeouts)
+    def __init__(self, workdir, interval=0.05):
+        super().__init__(daemon=True)
+        self.db_path = os.path.join(workdir, 'data', 'state.db')
+        self.pattern = os.path.join(workdir, 'data', '*.json')
+        self.interval = interval
+        self.reads = 0
+        self.corrupt = 0
+        self._halt = threading.Event()
+
+    def read_db(self):
+        import sqlite3
+        if not os.path.exists(self.db_path):
+            return
+        self.reads += 1
+        try:
+            conn = sqlite3.connect(self.db_path, timeout=1)
+            try:
+                conn.execute('SELECT COUNT(*), SUM(price) FROM ltp').fetchall()
+                conn.execute('SELECT COUNT(*) FROM blacklist').fetchall()
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            self.corrupt += 1
+
+    def run(self):
+        while not self._halt.is_set():
+            self.read_db()
+            for path in glob.glob(self.pattern):
+                try:
+                    with open(path) as f:
+                        json.load(f)
+                    self.reads += 1
+                except json.JSONDecodeError:
+                    self.reads += 1
+                    self.corrupt += 1
+                except OSError:
+                    pass
+            self._halt.wait(self.interval)
+
+    def stop(self):
+        self._halt.set()
+        self.join()
+
+
+def run_step(n, args, mock):
+    workdir = prepare_workdir(args.symbols, args.workdir)
+    server = ServerProcess(workdir, mock.upstox_ltp_url, args.fake_time, args.warm)
+    try:
+        server.wait_ready()
+        # Warm the server (imports, NSE.json cache) before taking the baseline
+        asyncio.run(run_session(server.ws_url, SessionStats(), time.perf_counter() + 15))
+        time.sleep(1)
+        rss_base = server.rss_mb()
+        mock.reset_counters()
+        watcher = StateWatcher(workdir)
+        watcher.start()
+
+        stats = [SessionStats() for _ in range(n)]
+        cpu0 = server.cpu_seconds()
+        wall0 = time.perf_counter()
+        stop_at = wall0 + args.duration
+
+        async def run_all():
+            tasks = []
+            for s in stats:
+                tasks.append(asyncio.create_task(run_session(server.ws_url, s, stop_at)))
+                if args.ramp:
+                    await asyncio.sleep(args.ramp / n)
+            await asyncio.gather(*tasks)
+
+        asyncio.run(run_all())
+        wall = time.perf_counter() - wall0
+        cpu1 = server.cpu_seconds()
+        rss_end = server.rss_mb()
+        watcher.stop()
+
+        latencies = np.array([x for s in stats for x in s.latencies]) if any(s.latencies for s in stats) else np.array([np.nan])
+        return {
+            'sessions': n,
+            'runs': sum(s.runs for s in stats),
+            'errors': sum(s.errors for s in stats),
+            'p50_ms': float(np.nanpercentile(latencies, 50)),
+            'p95_ms': float(np.nanpercentile(latencies, 95)),
+            'p99_ms': float(np.nanpercentile(latencies, 99)),
+            'cpu_pct': (cpu1 - cpu0) / wall * 100 if cpu0 is not None and cpu1 is not None else None,
+            'rss_base_mb': rss_base,
+            'rss_per_session_mb': (rss_end - rss_base) / n if rss_base is not None and rss_end is not None else None,
+            'upstream_requests': mock.requests,
+            'upstream_keys': mock.keys_served,
+            'kib_per_session': sum(s.bytes for s in stats) / 1024 / n,
+            'state_reads': watcher.reads,
+            'state_bad_reads': watcher.corrupt,
+        }
+    finally:
+        server.stop()
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def fmt(value, spec):
+    return format(value, spec) if value is not None else 'n/a'.rjust(len(format(0, spec)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent-session load test for the scanner")
+    parser.add_argument('--sessions', default='1,5,10,25', help="Comma-separated session counts")
+    parser.add_argument('--duration', type=float, default=60, help="Seconds per step")
+    parser.add_argument('--ramp', type=float, default=5, help="Seconds to spread session connects over")
+    parser.add_argument('--symbols', type=int, default=200, help="Synthetic underlyings")
+    parser.add_argument('--workdir', help="Copy NSE.json and data/ from this dir instead of synthetic data")
+    parser.add_argument('--fake-time', default='10:00', help="IST time of day for the server clock ('' = real time)")
+    parser.add_argument('--upstream-latency', type=float, default=50, help="Mock Upstox latency (ms)")
+    parser.add_argument('--upstream-jitter', type=float, default=50, help="Mock Upstox extra random latency (ms)")
+    parser.add_argument('--warm', action='store_true', help="Boot the server through startup.py (warm-up)")
+    parser.add_argument('--json', action='store_true', help="Print results as JSON")
+    parser.add_argument('--keep', action='store_true', help="Keep the temp workdirs (server.log)")
+    args = parser.parse_args()
+
+    mock = MockUpstream(latency_ms=args.upstream_latency, jitter_ms=args.upstream_jitter).start()
+    results = []
+    try:
+        if not args.json:
+            print(f"{'N':>4} {'runs':>6} {'err':>4} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'cpu %':>7} "
+                  f"{'RSS/sess MB':>11} {'upstream':>8} {'KiB/sess':>9} {'bad reads':>9}")
+        for n in [int(x) for x in args.sessions.split(',') if x]:
+            r = run_step(n, args, mock)
+            results.append(r)
+            if not args.json:
+                print(f"{r['sessions']:>4} {r['runs']:>6} {r['errors']:>4} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} "
+                      f"{r['p99_ms']:>8.1f} {fmt(r['cpu_pct'], '7.1f')} {fmt(r['rss_per_session_mb'], '11.2f')} "
+                      f"{r['upstream_requests']:>8} {r['kib_per_session']:>9.1f} {r['state_bad_reads']:>4}/{r['state_reads']:<4}")
+    finally:
+        mock.stop()
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+import json
+import time
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# Local stand-ins for the quote APIs (Upstox LTP GET, Dhan LTP POST), for
+# load tests and benchmarks. Prices random-walk per key; latency, occasional
+# stalls and error rate are configurable and every request is counted.
+
+
+class MockUpstream:
+    def __init__(self, port=0, latency_ms=0, jitter_ms=0, error_rate=0.0, seed=0,
+                 stall_rate=0.0, stall_ms=0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        # A stall_rate share of requests take an extra stall_ms (tail latency)
+        self.stall_rate = stall_rate
+        self.stall_ms = stall_ms
+        self.requests = 0
+        self.keys_served = 0
+        self.prices = {}
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                mock._handle(self)
+
+            def do_POST(self):
+                mock._handle_dhan(self)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    @property
+    def upstox_ltp_url(self):
+        return f"{self.url}/v3/market-quote/ltp"
+
+    @property
+    def dhan_ltp_url(self):
+        return f"{self.url}/v2/marketfeed/ltp"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def reset_counters(self):
+        with self._lock:
+            self.requests = 0
+            self.keys_served = 0
+
+    def price(self, key):
+        # Caller holds the lock
+        last = self.prices.get(key) or self._rng.uniform(5, 500)
+        self.prices[key] = round(max(0.05, last * (1 + self._rng.gauss(0, 0.01))), 2)
+        return self.prices[key]
+
+    def _delay(self):
+        with self._lock:
+            fail = self._rng.random() < self.error_rate
+            delay = self.latency_ms + (self._rng.uniform(0, self.jitter_ms) if self.jitter_ms else 0)
+            if self.stall_rate and self._rng.random() < self.stall_rate:
+                delay += self.stall_ms
+        if delay:
+            time.sleep(delay / 1000)
+        return fail
+
+    def _reply(self, handler, status, body):
+        data = json.dumps(body).encode()
+        handler.send_response(status)
+        handler.send_header('Content-Type', 'application/json')
+        handler.send_header('Content-Length', str(len(data)))
+        handler.end_headers()
+        handler.wfile.write(data)
+
+    def _handle(self, handler):
+        parsed = urlparse(handler.path)
+        if parsed.path != '/v3/market-quote/ltp':
+            self._reply(handler, 404, {'status': 'error'})
+            return
+        with self._lock:
+            self.requests += 1
+        if self._delay():
+            self._reply(handler, 500, {'status': 'error'})
+            return
+
+        keys = ','.join(parse_qs(parsed.query).get('instrument_key', [])).split(',')
+        keys = [k for k in keys if k]
+        with self._lock:
+            self.keys_served += len(keys)
+            data = {
+                k.replace('|', ':'): {'instrument_token': k, 'last_price': self.price(k)}
+                for k in keys
+            }
+        self._reply(handler, 200, {'status': 'success', 'data': data})
+
+    def _handle_dhan(self, handler):
+        if urlparse(handler.path).path != '/v2/marketfeed/ltp':
+            self._reply(handler, 404, {'status': 'failure'})
+            return
+        length = int(handler.headers.get('Content-Length') or 0)
+        body = json.loads(handler.rfile.read(length) or b'{}')
+        with self._lock:
+            self.requests += 1
+        if self._delay():
+            self._reply(handler, 500, {'status': 'failure'})
+            return
+
+        data = {}
+        with self._lock:
+            for segment, ids in body.items():
+                self.keys_served += len(ids)
+                data[segment] = {
+                    str(i): {'last_price': self.price(f"{segment}|{i}")}
+                    for i in ids
+                }
+        self._reply(handler, 200, {'status': 'success', 'data': data})
@@ -0,0 +1,352 @@
+import os
+import time
+import threading
+import concurrent.futures
+from collections import OrderedDict
+
+import pandas as pd
+
+from instruments import CONTRACT_COLUMNS, get_master
+
+# Quote providers for LTPs, with hedged requests and failover.
+#
+#   UpstoxProvider  GET  /v3/market-quote/ltp  (50 keys per request)
+#   DhanProvider    POST /v2/marketfeed/ltp    (1000 security ids per request;
+#                   Upstox instrument keys are mapped to Dhan security ids via
+#                   the Dhan scrip master downloaded by update_nse.update_dhan)
+#
+# QuoteRouter sends each refresh to the first healthy provider. Keys that are
+# still outstanding after the latency budget (QUOTE_HEDGE_MS) are also asked
+# of the next provider, and the first price per key wins. A provider whose
+# batches all failed fails over immediately. Health (latency, errors) is
+# tracked per provider and shared by every session in the process; after
+# repeated failures a provider is skipped for a cooldown.
+#
+# Dhan is used when DHAN_CLIENT_ID / DHAN_ACCESS_TOKEN are set (environment or
+# configure_dhan) and the scrip master exists. UPSTOX_LTP_URL / DHAN_LTP_URL
+# point the providers at local stand-ins (see mock_upstream.py).
+
+UPSTOX_LTP_URL = os.environ.get('UPSTOX_LTP_URL', "https://api.upstox.com/v3/market-quote/ltp")
+DHAN_LTP_URL = os.environ.get('DHAN_LTP_URL', "https://api.dhan.co/v2/marketfeed/ltp")
+# Where update_nse.update_dhan saves the scrip master
+DHAN_MASTER_PATH = os.environ.get('DHAN_SCRIP_MASTER', os.path.join('google scanner dhan', 'api-scrip-master.csv'))
+
+QUOTE_TIMEOUT = 10                                          # seconds, per request and per refresh
+HEDGE_AFTER_MS = int(os.environ.get('QUOTE_HEDGE_MS', '800'))
+FAILURE_THRESHOLD = 3                                       # consecutive failures before cooldown
+COOLDOWN_SECONDS = 30
+EWMA_ALPHA = 0.2
+
+
+class QuoteError(Exception):
+    pass
+
+
+def _http_session():
+    # Keep-alive pool sized for the router's workers, so only the first
+    # request (e.g. the boot warm-up) pays for connection setup
+    import requests
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=10)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+class ProviderHealth:
+    def __init__(self, name):
+        self.name = name
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.latency_ms = None          # EWMA of successful requests
+        self.open_until = 0.0           # monotonic time the cooldown ends
+        self._lock = threading.Lock()
+
+    @property
+    def available(self):
+        return time.monotonic() >= self.open_until
+
+    def record(self, ok, elapsed_ms):
+        with self._lock:
+            self.requests += 1
+            if ok:
+                self.consecutive_failures = 0
+                if self.latency_ms is None:
+                    self.latency_ms = elapsed_ms
+                else:
+                    self.latency_ms += EWMA_ALPHA * (elapsed_ms - self.latency_ms)
+            else:
+                self.failures += 1
+                self.consecutive_failures += 1
+                if self.consecutive_failures >= FAILURE_THRESHOLD:
+                    self.open_until = time.monotonic() + COOLDOWN_SECONDS
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'name': self.name,
+                'available': self.available,
+                'requests': self.requests,
+                'failures': self.failures,
+                'latency_ms': self.latency_ms,
+            }
+
+
+class UpstoxProvider:
+    name = 'upstox'
+    batch_size = 50
+
+    def __init__(self, token, url=UPSTOX_LTP_URL, timeout=QUOTE_TIMEOUT):
+        self.token = token
+        self.url = url
+        self.timeout = timeout
+        self.http = _http_session()
+
+    def ready(self):
+        return bool(self.token)
+
+    def fetch_batch(self, keys):
+        headers = {
+            'Accept': 'application/json',
+            'Authorization': f'Bearer {self.token}'
+        }
+        response = self.http.get(self.url, headers=headers, params={'instrument_key': ','.join(keys)},
+                                timeout=self.timeout)
+        if response.status_code != 200:
+            raise QuoteError(f"upstox HTTP {response.status_code}")
+        data = response.json()
+        if data.get('status') != 'success':
+            raise QuoteError(f"upstox status {data.get('status')}")
+        result = {}
+        for details in data.get('data', {}).values():
+            inst_token = details.get('instrument_token')
+            if inst_token is not None:
+                result[inst_token] = details.get('last_price')
+        return result
+
+
+def read_dhan_scrip_master(path=DHAN_MASTER_PATH):
+    # NSE derivative options from the Dhan scrip master, keyed like the
+    # Upstox master: (underlying_symbol, strike_price, instrument_type, expiry_dt)
+    usecols = ['SEM_EXM_EXCH_ID', 'SEM_SEGMENT', 'SEM_SMST_SECURITY_ID', 'SEM_INSTRUMENT_NAME',
+               'SEM_TRADING_SYMBOL', 'SEM_EXPIRY_DATE', 'SEM_STRIKE_PRICE', 'SEM_OPTION_TYPE']
+    df = pd.read_csv(path, usecols=usecols, low_memory=False)
+    df = df[(df['SEM_EXM_EXCH_ID'] == 'NSE') & (df['SEM_SEGMENT'] == 'D')
+            & df['SEM_INSTRUMENT_NAME'].isin(['OPTSTK', 'OPTIDX'])]
+    return pd.DataFrame({
+        # SYMBOL-Mon2026-STRIKE-CE; the symbol itself may contain '-' (BAJAJ-AUTO)
+        'underlying_symbol': df['SEM_TRADING_SYMBOL'].str.rsplit('-', n=3).str[0],
+        'strike_price': df['SEM_STRIKE_PRICE'].astype(float),
+        'instrument_type': df['SEM_OPTION_TYPE'],
+        'expiry_dt': pd.to_datetime(df['SEM_EXPIRY_DATE']).dt.normalize(),
+        'security_id': df['SEM_SMST_SECURITY_ID'].astype('int64'),
+    }).drop_duplicates(CONTRACT_COLUMNS)
+
+
+class DhanProvider:
+    name = 'dhan'
+    batch_size = 1000
+    segment = 'NSE_FNO'
+
+    def __init__(self, client_id, token, scrip_path=DHAN_MASTER_PATH, url=DHAN_LTP_URL,
+                 master=None, timeout=QUOTE_TIMEOUT):
+        self.client_id = client_id
+        self.token = token
+        self.scrip_path = scrip_path
+        self.url = url
+        self.timeout = timeout
+        self.http = _http_session()
+        self._master = master
+        self._scrips = None
+        self._scrips_mtime = None
+        self._ids = {}                  # instrument_key -> security_id (None = no Dhan contract)
+        self._ids_version = None
+        self._lock = threading.Lock()
+
+    @property
+    def master(self):
+        if self._master is None:
+            self._master = get_master()
+        return self._master
+
+    def ready(self):
+        return bool(self.token) and os.path.exists(self.scrip_path)
+
+    def security_ids(self, keys):
+        # Map Upstox instrument keys to Dhan security ids through the contract
+        # (symbol, strike, type, expiry). Cached until either master changes.
+        master = self.master
+        mtime = os.path.getmtime(self.scrip_path)
+        with self._lock:
+            if mtime != self._scrips_mtime:
+                self._scrips = read_dhan_scrip_master(self.scrip_path)
+                self._scrips_mtime = mtime
+                self._ids = {}
+            if master.version != self._ids_version:
+                self._ids = {}
+                self._ids_version = master.version
+            missing = [k for k in keys if k not in self._ids]
+            if missing:
+                frame = master.frame
+                contracts = frame[frame['instrument_key'].isin(missing)]
+                mapped = pd.merge(contracts, self._scrips, on=CONTRACT_COLUMNS)
+                self._ids.update({k: None for k in missing})
+                self._ids.update(zip(mapped['instrument_key'], mapped['security_id'].tolist()))
+            return {k: self._ids[k] for k in keys if self._ids[k] is not None}
+
+    def fetch_batch(self, keys):
+        ids = self.security_ids(keys)
+        if not ids:
+            return {}
+        headers = {
+            'Accept': 'application/json',
+            'Content-Type': 'application/json',
+            'access-token': self.token,
+            'client-id': self.client_id,
+        }
+        response = self.http.post(self.url, headers=headers, json={self.segment: list(ids.values())},
+                                 timeout=self.timeout)
+        if response.status_code != 200:
+            raise QuoteError(f"dhan HTTP {response.status_code}")
+        data = response.json()
+        if data.get('status') != 'success':
+            raise QuoteError(f"dhan status {data.get('status')}")
+        quotes = data.get('data', {}).get(self.segment, {})
+        result = {}
+        for key, security_id in ids.items():
+            details = quotes.get(str(security_id))
+            if details and details.get('last_price') is not None:
+                result[key] = details['last_price']
+        return result
+
+
+_health = {}
+_health_lock = threading.Lock()
+
+
+def get_health(name):
+    # Shared per process, so every session and router sees the same state
+    with _health_lock:
+        if name not in _health:
+            _health[name] = ProviderHealth(name)
+        return _health[name]
+
+
+def health_report():
+    with _health_lock:
+        return [h.snapshot() for h in _health.values()]
+
+
+class QuoteRouter:
+    def __init__(self, providers, hedge_after_ms=HEDGE_AFTER_MS, timeout=QUOTE_TIMEOUT):
+        self.providers = providers
+        self.hedge_after = hedge_after_ms / 1000
+        self.timeout = timeout
+        self.health = {p.name: get_health(p.name) for p in providers}
+        # One pool per provider, so a stalled provider can't hold up the hedge
+        self._pools = {p.name: concurrent.futures.ThreadPoolExecutor(max_workers=10, thread_name_prefix=f'quotes-{p.name}')
+                       for p in providers}
+
+    def ranked(self):
+        # Ready providers in preference order, ones in cooldown last
+        ready = [p for p in self.providers if p.ready()]
+        return [p for p in ready if self.health[p.name].available] + \
+               [p for p in ready if not self.health[p.name].available]
+
+    def _call(self, provider, batch):
+        start = time.perf_counter()
+        try:
+            result = provider.fetch_batch(batch)
+        except Exception:
+            self.health[provider.name].record(False, (time.perf_counter() - start) * 1000)
+            return None
+        self.health[provider.name].record(True, (time.perf_counter() - start) * 1000)
+        return result
+
+    def _submit(self, provider, keys, pending):
+        size = provider.batch_size
+        for i in range(0, len(keys), size):
+            try:
+                future = self._pools[provider.name].submit(self._call, provider, keys[i:i + size])
+            except RuntimeError:
+                # Router closed (evicted) mid-fetch: return what's in flight
+                return
+            pending[future] = provider
+
+    def fetch(self, keys):
+        providers = self.ranked()
+        if not providers or not keys:
+            return {}
+
+        result = {}
+        outstanding = set(keys)
+        pending = {}
+        level = 0
+        start = time.monotonic()
+        deadline = start + self.timeout
+        hedge_at = start
+
+        while outstanding:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            # Hedge when the budget runs out, fail over when nothing is in flight
+            if level < len(providers) and (now >= hedge_at or not pending):
+                self._submit(providers[level], [k for k in keys if k in outstanding], pending)
+                level += 1
+                hedge_at = now + self.hedge_after
+            if not pending:
+                break
+            wait_until = hedge_at if level < len(providers) else deadline
+            done, _ = concurrent.futures.wait(pending, timeout=max(0.0, min(wait_until, deadline) - now),
+                                              return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                del pending[future]
+                prices = future.result()
+                if not prices:
+                    continue
+                for k, price in prices.items():
+                    if k in outstanding:
+                        result[k] = price
+                        outstanding.discard(k)
+        # Requests still in flight finish in the background and only update health
+        return result
+
+    def close(self):
+        for pool in self._pools.values():
+            pool.shutdown(wait=False)
+
+
+_dhan_config = {
+    'client_id': os.environ.get('DHAN_CLIENT_ID', ''),
+    'token': os.environ.get('DHAN_ACCESS_TOKEN', ''),
+}
+# Routers per credential tuple, so sessions on different tokens (two admins,
+# yesterday's token) share pools instead of tearing each other's down
+MAX_ROUTERS = 4
+_routers = OrderedDict()
+_router_lock = threading.Lock()
+
+
+def configure_dhan(client_id, token):
+    with _router_lock:
+        _dhan_config['client_id'] = client_id or ''
+        _dhan_config['token'] = token or ''
+
+
+def get_router(upstox_token):
+    # Process-wide router for these credentials; the least recently used one
+    # is closed past MAX_ROUTERS
+    key = (upstox_token, _dhan_config['client_id'], _dhan_config['token'])
+    with _router_lock:
+        router = _routers.get(key)
+        if router is None:
+            providers = [UpstoxProvider(upstox_token)]
+            if _dhan_config['token']:
+                providers.append(DhanProvider(_dhan_config['client_id'], _dhan_config['token']))
+            router = _routers[key] = QuoteRouter(providers)
+            while len(_routers) > MAX_ROUTERS:
+                _routers.popitem(last=False)[1].close()
+        _routers.move_to_end(key)
+        return router
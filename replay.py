@@ -0,0 +1,214 @@
+import sys
+import time
+import json
+import hashlib
+import argparse
+from datetime import datetime, timedelta
+
+import numpy as np
+from streamlit import logger as st_logger
+
+import scanner
+import instruments
+import tick_store
+import delta_table
+from scanner import IST, TABS
+
+# Replays a recorded trading day through the scanner pipeline on a simulated
+# IST clock, the way the app refreshes: InstrumentMaster.atm_table -> LTP ->
+# build_option_chain -> table payload. LTPs come from the recorded ticks as of
+# the simulated time instead of resolve_ltp's live fetch, so no token or live
+# market is needed.
+#
+#   python replay.py --day 2026-01-29 --tab Intraday --speed 0
+#   python replay.py --day 2026-01-29 --bhavcopy BhavCopy.csv --expect <digest>
+#
+# --speed is simulated seconds per wall second (0 = as fast as possible). The
+# digest hashes every refresh's CE/PE order, change % and blacklist, so a run
+# is a deterministic regression check for the same inputs.
+
+STAGES = ['bhavcopy', 'ltp', 'chain', 'payload']
+
+
+class ReplayMaster(instruments.InstrumentMaster):
+    # The app's instrument index and ATM table cache, fed one bhavcopy
+    def __init__(self, path, bhavcopy, name):
+        super().__init__(path)
+        self.bhavcopy = bhavcopy
+        self.bhavcopy_name = name
+
+    def bhavcopy_info(self, tab):
+        return (self.bhavcopy_name, 0.0)
+
+    def load_bhavcopy(self, tab):
+        return self.bhavcopy
+
+
+class SimClock:
+    def __init__(self, start):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+
+def load_ticks(day, ticks_file=None):
+    # (ts, instrument_key, price) sorted by time, from the tick store or a CSV export
+    if ticks_file:
+        import pandas as pd
+        ticks = pd.read_csv(ticks_file)
+    else:
+        ticks = tick_store.read_day(day)
+    return ticks.sort_values('ts', kind='stable').reset_index(drop=True)
+
+
+def chain_digest(calls_df, puts_df, blacklist):
+    h = hashlib.sha256()
+    for frame in (calls_df, puts_df):
+        h.update('|'.join(frame['instrument_key'].astype(str)).encode())
+        h.update(np.round(frame['change %'].to_numpy(dtype=float), 4).tobytes())
+    h.update('|'.join(sorted(blacklist)).encode())
+    return h.digest()
+
+
+def replay(day, tab='Monthly', bhavcopy=None, nse_json=scanner.NSE_JSON_PATH, ticks_file=None,
+           start='09:00', end='15:40', interval=15, speed=0, expiry_index=0, verbose=False):
+    source = bhavcopy or f"stored {tab} bhavcopy"
+    bhavcopy = bhavcopy or scanner.load_bhavcopy(tab)
+    if bhavcopy is None:
+        raise SystemExit(f"No {tab} bhavcopy in the store; pass --bhavcopy")
+    master = ReplayMaster(nse_json, bhavcopy, source)
+    master.apply(scanner.read_nse_json(nse_json))
+    ticks = load_ticks(day, ticks_file)
+
+    day_dt = datetime.strptime(day, '%Y-%m-%d').replace(tzinfo=IST)
+    t_start = datetime.combine(day_dt.date(), datetime.strptime(start, '%H:%M').time(), IST)
+    t_end = datetime.combine(day_dt.date(), datetime.strptime(end, '%H:%M').time(), IST)
+
+    clock = SimClock(t_start)
+    scanner.set_clock(clock)
+
+    ts = ticks['ts'].to_numpy(dtype='int64')
+    keys = ticks['instrument_key'].tolist()
+    prices = ticks['price'].tolist()
+    cursor = 0
+    ltp_map = {}
+    blacklist = set()
+    snapshot = {'CE': None, 'PE': None}
+    timings = {stage: [] for stage in STAGES}
+    digest = hashlib.sha256()
+    refreshes = 0
+
+    wall_start = time.perf_counter()
+    try:
+        while clock.now <= t_end:
+            # --- bhavcopy -> ATM table (cached after the first refresh, as in the app) ---
+            t0 = time.perf_counter()
+            df = master.atm_table(tab, expiry_index)
+            t1 = time.perf_counter()
+            if df.empty:
+                raise SystemExit(f"No ATM rows from {source} for {day}")
+
+            # --- LTP: apply recorded ticks up to the simulated time ---
+            epoch = int(clock.now.timestamp())
+            stop = int(np.searchsorted(ts, epoch, side='right'))
+            for i in range(cursor, stop):
+                ltp_map[keys[i]] = prices[i]
+            cursor = stop
+            all_keys = df['instrument_key'].dropna().unique().tolist()
+            ltp_data = {k: ltp_map.get(k, 0.0) for k in all_keys}
+            t2 = time.perf_counter()
+
+            # --- Option chain: change %, blacklist, sort ---
+            calls_df, puts_df, new_violators = scanner.build_option_chain(df, ltp_data, tab, blacklist)
+            blacklist |= new_violators
+            t3 = time.perf_counter()
+
+            # --- Payload: what a delta-mode session would be sent ---
+            for side, frame in (('CE', calls_df), ('PE', puts_df)):
+                curr = delta_table.snapshot_frame(frame)
+                delta_table.build_payload(snapshot[side], curr, refreshes + 1, refreshes if snapshot[side] else None)
+                snapshot[side] = curr
+            t4 = time.perf_counter()
+
+            for stage, elapsed in zip(STAGES, (t1 - t0, t2 - t1, t3 - t2, t4 - t3)):
+                timings[stage].append(elapsed * 1000)
+            digest.update(chain_digest(calls_df, puts_df, blacklist))
+            refreshes += 1
+
+            if verbose:
+                top = calls_df.head(1)
+                lead = f"{top['Symbol'].iloc[0]} {top['change %'].iloc[0]:.2f}%" if not top.empty else '-'
+                print(f"{clock.now:%H:%M:%S}  CE {len(calls_df):4d}  PE {len(puts_df):4d}  "
+                      f"blacklist {len(blacklist):3d}  top CE {lead}")
+
+            clock.now += timedelta(seconds=interval)
+            if speed > 0:
+                due = wall_start + (clock.now - t_start).total_seconds() / speed
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+    finally:
+        scanner.set_clock(None)
+
+    wall = time.perf_counter() - wall_start
+    return {
+        'refreshes': refreshes,
+        'ticks': cursor,
+        'wall_s': wall,
+        'refresh_per_s': refreshes / wall if wall else 0.0,
+        'ticks_per_s': cursor / wall if wall else 0.0,
+        'stages': {
+            stage: {
+                'p50_ms': float(np.percentile(v, 50)),
+                'p95_ms': float(np.percentile(v, 95)),
+                'max_ms': float(np.max(v)),
+            } for stage, v in timings.items() if v
+        },
+        'blacklist': sorted(blacklist),
+        'digest': digest.hexdigest(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded trading day through the scanner")
+    parser.add_argument('--day', required=True, help="Trading day (YYYY-MM-DD) in the tick store")
+    parser.add_argument('--tab', default='Monthly', choices=TABS)
+    parser.add_argument('--bhavcopy', help="Bhavcopy CSV (default: the tab's stored bhavcopy)")
+    parser.add_argument('--nse-json', default=scanner.NSE_JSON_PATH)
+    parser.add_argument('--ticks', help="Ticks CSV (ts, instrument_key, price) instead of the tick store")
+    parser.add_argument('--start', default='09:00')
+    parser.add_argument('--end', default='15:40')
+    parser.add_argument('--interval', type=int, default=15, help="Refresh interval in simulated seconds")
+    parser.add_argument('--speed', type=float, default=0, help="Simulated seconds per wall second (0 = max)")
+    parser.add_argument('--expiry-index', type=int, default=0)
+    parser.add_argument('--expect', help="Expected digest; exit 1 on mismatch")
+    parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+    parser.add_argument('-v', '--verbose', action='store_true')
+    args = parser.parse_args()
+
+    # st.error/st.warning outside a running app only log
+    st_logger.set_log_level('error')
+
+    result = replay(
+        args.day, args.tab, args.bhavcopy, args.nse_json, args.ticks,
+        args.start, args.end, args.interval, args.speed, args.expiry_index, args.verbose
+    )
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"Refreshes: {result['refreshes']}  Ticks: {result['ticks']}  Wall: {result['wall_s']:.2f}s")
+        print(f"Throughput: {result['refresh_per_s']:.1f} refresh/s, {result['ticks_per_s']:.0f} ticks/s")
+        for stage, s in result['stages'].items():
+            print(f"  {stage:<10} p50 {s['p50_ms']:8.2f} ms  p95 {s['p95_ms']:8.2f} ms  max {s['max_ms']:8.2f} ms")
+        print(f"Blacklisted: {len(result['blacklist'])}")
+        print(f"Digest: {result['digest']}")
+
+    if args.expect and args.expect != result['digest']:
+        print(f"Digest mismatch: expected {args.expect}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import pandas as pd
+
+# Read-only results API served next to the app. Sessions publish each built
+# CE/PE table here; the API serves the latest snapshot without recomputing.
+#
+#   GET /v1/snapshots
+#   GET /v1/chain?tab=Monthly&expiry=0&side=CE&min_change=90&format=json|arrow
+#
+# Every snapshot carries a version that only changes when the table content
+# does; it is the ETag, so pollers sending If-None-Match get a bodyless 304
+# until something moves. Encoded bodies are cached per (version, filters).
+#
+# SCANNER_API_HOST / SCANNER_API_PORT set the bind address (127.0.0.1:8600).
+
+API_HOST = os.environ.get('SCANNER_API_HOST', '127.0.0.1')
+API_PORT = int(os.environ.get('SCANNER_API_PORT', '8600'))
+
+ARROW_MIME = 'application/vnd.apache.arrow.stream'
+RESPONSE_CACHE_SIZE = 256
+
+SNAPSHOT_COLUMNS = {
+    'Symbol': 'symbol',
+    'StrikePrice': 'strike',
+    'Trigger': 'trigger',
+    'ltp': 'ltp',
+    'change %': 'change_pct',
+    'instrument_key': 'instrument_key',
+    'OptionType': 'side',
+}
+
+_lock = threading.Lock()
+_snapshots = {}                       # (tab, expiry_index) -> snapshot dict
+_responses = OrderedDict()            # (tab, expiry, version, side, min_change, fmt) -> bytes
+_server = None
+_boot_id = format(int(time.time()), 'x')  # keeps ETags unique across restarts
+
+
+def publish(tab, expiry_index, calls_df, puts_df):
+    # Store the built CE/PE tables as the current snapshot for (tab, expiry).
+    # The version only moves when the content changes.
+    frame = pd.concat([calls_df, puts_df], ignore_index=True)
+    frame = frame[list(SNAPSHOT_COLUMNS)].rename(columns=SNAPSHOT_COLUMNS)
+    digest = int(pd.util.hash_pandas_object(frame, index=False).sum())
+    key = (tab, int(expiry_index))
+    with _lock:
+        current = _snapshots.get(key)
+        if current is not None and current['digest'] == digest:
+            return current['version']
+        version = current['version'] + 1 if current else 1
+        _snapshots[key] = {
+            'version': version,
+            'digest': digest,
+            'as_of': time.time(),
+            'frame': frame,
+        }
+        return version
+
+
+def get_snapshot(tab, expiry_index=0):
+    with _lock:
+        return _snapshots.get((tab, int(expiry_index)))
+
+
+def _encode(snapshot, tab, expiry_index, side, min_change, fmt):
+    frame = snapshot['frame']
+    if side:
+        frame = frame[frame['side'] == side]
+    if min_change is not None:
+        frame = frame[frame['change_pct'] >= min_change]
+
+    if fmt == 'arrow':
+        import pyarrow as pa
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        table = table.replace_schema_metadata({
+            'tab': tab,
+            'expiry_index': str(expiry_index),
+            'version': str(snapshot['version']),
+            'as_of': str(snapshot['as_of']),
+        })
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+    header = json.dumps({
+        'tab': tab,
+        'expiry_index': expiry_index,
+        'version': snapshot['version'],
+        'as_of': snapshot['as_of'],
+    }, separators=(',', ':'))
+    # pandas writes NaN as null (json.dumps would emit invalid NaN)
+    return (header[:-1] + ',"rows":' + frame.to_json(orient='records') + '}').encode()
+
+
+def etag_for(tab, expiry_index, version, fmt):
+    return f'"{_boot_id}-{tab}-{expiry_index}-{version}-{fmt}"'
+
+
+def render_chain(tab, expiry_index=0, side=None, min_change=None, fmt='json', if_none_match=()):
+    # (etag, body) for a filtered view of the current snapshot, (etag, None)
+    # when if_none_match already holds the current ETag, or None if there is
+    # no snapshot yet
+    snapshot = get_snapshot(tab, expiry_index)
+    if snapshot is None:
+        return None
+    version = snapshot['version']
+    etag = etag_for(tab, expiry_index, version, fmt)
+    if etag in if_none_match:
+        return etag, None
+    cache_key = (tab, expiry_index, version, side, min_change, fmt)
+    with _lock:
+        body = _responses.get(cache_key)
+        if body is not None:
+            _responses.move_to_end(cache_key)
+            return etag, body
+    body = _encode(snapshot, tab, expiry_index, side, min_change, fmt)
+    with _lock:
+        _responses[cache_key] = body
+        while len(_responses) > RESPONSE_CACHE_SIZE:
+            _responses.popitem(last=False)
+    return etag, body
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body=b'', content_type='application/json', etag=None):
+        self.send_response(status)
+        if etag:
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'no-cache')
+        if body:
+            self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def _error(self, status, message):
+        self._send(status, json.dumps({'error': message}).encode())
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        params = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+
+        if parsed.path == '/v1/snapshots':
+            with _lock:
+                listing = [
+                    {'tab': tab, 'expiry_index': exp, 'version': s['version'],
+                     'as_of': s['as_of'], 'rows': len(s['frame'])}
+                    for (tab, exp), s in sorted(_snapshots.items())
+                ]
+            self._send(200, json.dumps(listing).encode())
+            return
+
+        if parsed.path != '/v1/chain':
+            self._error(404, 'not found')
+            return
+
+        tab = params.get('tab', 'Monthly')
+        side = params.get('side', '').upper() or None
+        fmt = params.get('format') or ('arrow' if ARROW_MIME in self.headers.get('Accept', '') else 'json')
+        try:
+            expiry_index = int(params.get('expiry', 0))
+            min_change = float(params['min_change']) if 'min_change' in params else None
+        except ValueError:
+            self._error(400, 'expiry must be an integer and min_change a number')
+            return
+        if side not in (None, 'CE', 'PE'):
+            self._error(400, 'side must be CE or PE')
+            return
+        if fmt not in ('json', 'arrow'):
+            self._error(400, 'format must be json or arrow')
+            return
+        if fmt == 'arrow':
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                self._error(406, 'pyarrow is not installed on the server')
+                return
+
+        if_none_match = [t.strip() for t in self.headers.get('If-None-Match', '').split(',')]
+        result = render_chain(tab, expiry_index, side, min_change, fmt, if_none_match)
+        if result is None:
+            self._error(404, f'no snapshot for tab={tab} expiry={expiry_index} yet')
+            return
+        etag, body = result
+        if body is None:
+            self._send(304, etag=etag)
+            return
+        self._send(200, body, ARROW_MIME if fmt == 'arrow' else 'application/json', etag)
+
+
+def start(host=API_HOST, port=API_PORT):
+    # Start the API once per process (idempotent). Returns the server, or None
+    # if the port is taken (e.g. another app process already serves it).
+    global _server
+    with _lock:
+        if _server is not None:
+            return _server
+        try:
+            server = ThreadingHTTPServer((host, port), _Handler)
+        except OSError:
+            return None
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name='results-api', daemon=True).start()
+        _server = server
+        return server
@@ -0,0 +1,394 @@
+import streamlit as st
+import pandas as pd
+import numpy as np
+import os
+import io
+import re
+import time
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+import store
+from store import DATA_DIR, FILES
+
+# IST Offset
+IST_OFFSET = timedelta(hours=5, minutes=30)
+IST = timezone(IST_OFFSET)
+
+# Replay (see replay.py) swaps in a simulated clock
+_clock = None
+
+def set_clock(clock):
+    global _clock
+    _clock = clock
+
+def get_ist_now():
+    if _clock is not None:
+        return _clock()
+    return datetime.now(IST)
+
+# SCANNER_FAKE_TIME=HH:MM starts the clock at that IST time of day (load tests
+# use it to exercise the market-hours path at any hour)
+if os.environ.get('SCANNER_FAKE_TIME'):
+    _fake_start = datetime.combine(
+        datetime.now(IST).date(),
+        datetime.strptime(os.environ['SCANNER_FAKE_TIME'], '%H:%M').time(),
+        IST
+    )
+    _real_start = time.monotonic()
+    set_clock(lambda: _fake_start + timedelta(seconds=time.monotonic() - _real_start))
+
+# Persistent state lives in the SQLite store (see store.py)
+if not os.path.exists(DATA_DIR):
+    os.makedirs(DATA_DIR)
+
+TABS = list(FILES.keys())
+
+# Constant for NSE JSON
+NSE_JSON_PATH = 'NSE.json'
+
+# Market windows (IST)
+MARKET_OPEN = datetime.strptime("09:00", "%H:%M").time()
+MARKET_CLOSE = datetime.strptime("15:40", "%H:%M").time()
+BLACKLIST_CUTOFF = datetime.strptime("09:30", "%H:%M").time()
+
+# Prices fetched this recently (by another session, or the boot warm-up in
+# startup.py) are reused during market hours instead of fetched again
+LTP_FRESH_SECONDS = 5
+
+# Colour bands for change % (replaces per-cell Styler colouring)
+BAND_STRONG = '🟩🟩'  # change % >= 100
+BAND_NEAR = '🟩'      # change % >= 90
+
+DISPLAY_COLS = ['Band', 'Symbol', 'StrikePrice', 'Trigger', 'ltp', 'change %']
+
+def today_str():
+    return get_ist_now().strftime('%Y-%m-%d')
+
+def load_meta():
+    try:
+        return store.get_meta()
+    except sqlite3.Error:
+        return {}
+
+def save_meta(key, date_str):
+    try:
+        store.set_meta(key, date_str)
+    except sqlite3.Error:
+        pass
+
+def load_ltp_cache(keys=None, max_age=None):
+    try:
+        return store.get_ltps(keys, max_age)
+    except sqlite3.Error:
+        return {}
+
+def save_ltp_cache(new_data):
+    try:
+        store.upsert_ltps(new_data)
+    except sqlite3.Error:
+        pass
+
+def record_ticks(prices):
+    # Tick history is best-effort; a disk error must not break the refresh
+    try:
+        from tick_store import append_ticks
+        append_ticks(prices)
+    except OSError as e:
+        print(f"Tick history not recorded: {e}", flush=True)
+
+def extract_date_from_filename(filename):
+    # Regex to find 8-digit date like 20260130
+    match = re.search(r'(\d{8})', filename)
+    if match:
+        d = match.group(1)
+        # Format as YYYY-MM-DD
+        return f"{d[:4]}-{d[4:6]}-{d[6:]}"
+    return None
+
+def load_token():
+    try:
+        return store.get_token(today_str())
+    except sqlite3.Error:
+        return ''
+
+def save_token(token):
+    try:
+        store.set_token(today_str(), token)
+    except sqlite3.Error:
+        pass
+
+def load_blacklist():
+    try:
+        return store.get_blacklist(today_str())
+    except sqlite3.Error:
+        return set()
+
+def add_to_blacklist(keys):
+    try:
+        store.add_blacklist(today_str(), keys)
+    except sqlite3.Error:
+        pass
+
+def load_bhavcopy(tab):
+    # Raw CSV bytes for a tab, or None if nothing uploaded
+    try:
+        return store.get_bhavcopy(tab)
+    except sqlite3.Error:
+        return None
+
+def bhavcopy_info(tab):
+    # (csv name, uploaded_at epoch) for a tab, or None
+    try:
+        return store.get_bhavcopy_info(tab)
+    except sqlite3.Error:
+        return None
+
+def save_bhavcopy(tab, name, content):
+    store.put_bhavcopy(tab, name, content)
+
+def read_nse_json(path=NSE_JSON_PATH):
+    df = pd.read_json(path)
+    # Pre-process JSON
+    if 'segment' in df.columns:
+        df = df[df['segment'] == 'NSE_FO']
+    df['expiry_dt'] = pd.to_datetime(df['expiry'], unit='ms').dt.normalize()
+    return df
+
+def process_bhavcopy(bhav_file, df_json, target_expiry_index=0):
+    atm_rows = select_atm_rows(bhav_file, target_expiry_index)
+    if atm_rows.empty:
+        return pd.DataFrame()
+    return join_instruments(atm_rows, df_json)
+
+# Bhavcopy columns the ATM selection needs (FinInstrmNm is carried if present)
+BHAV_COLUMNS = ['FinInstrmTp', 'TckrSymb', 'XpryDt', 'ClsPric', 'StrkPric', 'OptnTp', 'HghPric', 'LwPric', 'LastPric']
+
+def select_atm_rows(bhav_file, target_expiry_index=0):
+    # Bhavcopy-only half of process_bhavcopy: the ATM strike's CE/PE rows per
+    # symbol for the target expiry. Independent of the instrument master.
+    try:
+        # Path / file object, or raw CSV bytes from the store
+        if isinstance(bhav_file, bytes):
+            bhav_file = io.BytesIO(bhav_file)
+        # Parse only the columns used below (the full bhavcopy has ~35)
+        df_bhav = pd.read_csv(bhav_file, usecols=lambda c: c in BHAV_COLUMNS or c == 'FinInstrmNm')
+
+        # Check required columns
+        if not all(col in df_bhav.columns for col in BHAV_COLUMNS):
+            st.error(f"Uploaded file missing required columns: {BHAV_COLUMNS}")
+            return pd.DataFrame()
+
+        target_expiry = pick_target_expiry(df_bhav, target_expiry_index)
+        if target_expiry is None:
+            return pd.DataFrame()
+        return atm_rows_for_expiry(df_bhav, target_expiry)
+
+    except Exception as e:
+        st.error(f"Error processing file: {e}")
+        return pd.DataFrame()
+
+def pick_target_expiry(df_bhav, target_expiry_index=0):
+    # The futures expiry to scan, or None (with a warning) if there is none.
+    # Chosen over the whole bhavcopy, so shards of it (see shards.py) agree.
+    futures = df_bhav[df_bhav['FinInstrmTp'].isin(['STF', 'IDF'])].copy()
+    if futures.empty:
+        st.warning("No Futures data found in uploaded file.")
+        return None
+
+    futures['XpryDt'] = pd.to_datetime(futures['XpryDt'])
+
+    # Filter out past expiries (Keep today and future)
+    # We use IST time to match the environment's expectation
+    ist_now = get_ist_now()
+    today = ist_now.replace(hour=0, minute=0, second=0, microsecond=0).replace(tzinfo=None)
+
+    futures = futures[futures['XpryDt'] >= today]
+    if futures.empty:
+        st.warning("No future expiries found in the uploaded file.")
+        return None
+
+    # Identify unique expiry dates available in the bhavcopy
+    available_expiries = sorted(futures['XpryDt'].unique())
+
+    # Select target expiry based on index (0 for Near, 1 for Next)
+    if target_expiry_index >= len(available_expiries):
+        # Fallback to the latest available if index is out of range
+        return available_expiries[-1]
+    return available_expiries[target_expiry_index]
+
+def atm_rows_for_expiry(df_bhav, target_expiry):
+    # ATM CE/PE rows per symbol for one futures expiry. Works on any subset of
+    # symbols, which is what lets shards.py split the bhavcopy by underlying.
+    futures = df_bhav[df_bhav['FinInstrmTp'].isin(['STF', 'IDF'])].copy()
+    futures['XpryDt'] = pd.to_datetime(futures['XpryDt'])
+
+    # Filter futures for the target expiry per symbol
+    near_futures = futures[futures['XpryDt'] == target_expiry].copy()
+
+    # If a symbol doesn't have the target expiry, it will be skipped
+    near_futures = near_futures[['TckrSymb', 'ClsPric', 'XpryDt']]
+    near_futures = near_futures.rename(columns={'ClsPric': 'FuturePrice', 'XpryDt': 'FutureExpiryDate'})
+
+    # --- Process Bhavcopy Options ---
+    options = df_bhav[df_bhav['OptnTp'].isin(['CE', 'PE'])].copy()
+    if options.empty:
+        st.warning("No Options data found in uploaded file.")
+        return pd.DataFrame()
+
+    options['XpryDt'] = pd.to_datetime(options['XpryDt'])
+
+    # Merge Options with selected Futures expiry
+    merged = pd.merge(options, near_futures, on='TckrSymb')
+    merged = merged[merged['XpryDt'] == merged['FutureExpiryDate']]
+
+    # Calculate ATM
+    merged['Diff'] = abs(merged['StrkPric'] - merged['FuturePrice'])
+
+    # Find best strike per symbol (Minimize Diff, then tie-break with StrikePrice)
+    # This ensures only ONE strike is selected per symbol, eliminating duplicates
+    best_strikes = merged[['TckrSymb', 'StrkPric', 'Diff']].drop_duplicates()
+    best_strikes = best_strikes.sort_values(by=['TckrSymb', 'Diff', 'StrkPric'])
+    best_strikes = best_strikes.groupby('TckrSymb').first().reset_index()
+
+    atm_options = pd.merge(merged, best_strikes[['TckrSymb', 'StrkPric']], on=['TckrSymb', 'StrkPric'])
+    atm_rows = atm_options[['TckrSymb', 'XpryDt', 'StrkPric', 'OptnTp', 'FuturePrice', 'ClsPric', 'FinInstrmNm', 'HghPric', 'LwPric', 'LastPric']].copy()
+
+    # Normalize dates for merging
+    atm_rows['XpryDt'] = atm_rows['XpryDt'].dt.normalize()
+    return atm_rows
+
+def join_instruments(atm_rows, df_json):
+    # Master half of process_bhavcopy: attach instrument keys to the ATM rows
+    try:
+        # Merge with Upstox JSON
+        result = pd.merge(
+            atm_rows,
+            df_json,
+            left_on=['TckrSymb', 'StrkPric', 'OptnTp', 'XpryDt'],
+            right_on=['underlying_symbol', 'strike_price', 'instrument_type', 'expiry_dt'],
+            how='inner'
+        )
+
+        final_df = result[[
+            'TckrSymb', 'XpryDt', 'StrkPric', 'OptnTp',
+            'FuturePrice', 'ClsPric', 'instrument_key',
+            'HghPric', 'LwPric', 'LastPric'
+        ]]
+
+        final_df = final_df.rename(columns={
+            'TckrSymb': 'Symbol',
+            'XpryDt': 'ExpiryDate',
+            'StrkPric': 'StrikePrice',
+            'OptnTp': 'OptionType',
+            'ClsPric': 'Trigger',
+            'HghPric': 'HighPrice',
+            'LwPric': 'LowPrice',
+            'LastPric': 'LastPrice'
+        })
+
+        # Calculate Camarilla R4
+        # Formula: Close + (High - Low) * 1.1 / 2
+        final_df['Camarilla_R4'] = final_df['Trigger'] + (final_df['HighPrice'] - final_df['LowPrice']) * 1.1 / 2
+
+        # Multiply Trigger by 2 (User Rule)
+        if 'Trigger' in final_df.columns:
+            final_df['Trigger'] = final_df['Trigger'] * 2
+
+        return final_df
+
+    except Exception as e:
+        st.error(f"Error processing file: {e}")
+        return pd.DataFrame()
+
+def fetch_ltp(instrument_keys, token):
+    # Hedged across the configured quote providers (Upstox, Dhan); see quotes.py
+    from quotes import get_router
+    return get_router(token).fetch(instrument_keys)
+
+def resolve_ltp(all_keys, access_token):
+    # Time-based Fetch Logic
+    current_time = get_ist_now().time()
+    is_market_hours = MARKET_OPEN <= current_time <= MARKET_CLOSE
+
+    # Load Cache (only the keys on screen)
+    ltp_cache = load_ltp_cache(all_keys)
+
+    # Identify missing keys
+    missing_keys = [k for k in all_keys if k not in ltp_cache]
+
+    # Live Market Update, or Populating Missing Data outside market hours
+    if is_market_hours:
+        fresh = load_ltp_cache(all_keys, max_age=LTP_FRESH_SECONDS)
+        keys_to_fetch = [k for k in all_keys if k not in fresh]
+    else:
+        keys_to_fetch = missing_keys
+
+    if keys_to_fetch:
+        # Fetch silently
+        fetched_data = fetch_ltp(keys_to_fetch, access_token)
+        if fetched_data:
+            save_ltp_cache(fetched_data)
+            # Keep the intraday path, not just the latest price
+            record_ticks(fetched_data)
+            # Merge locally instead of re-reading the whole cache file
+            ltp_cache.update(fetched_data)
+
+    # Use data from cache
+    return {k: ltp_cache.get(k, 0.0) for k in all_keys}
+
+def build_option_chain(df, ltp_data, key_suffix, blacklist=None):
+    # Compute half of the option chain view: LTP, change %, colour band,
+    # Intraday blacklist, then split and sort into Calls / Puts.
+    # Returns (calls_df, puts_df, new_violators).
+    df = add_change_pct(df, ltp_data, key_suffix)
+    return rank_option_chain(df, key_suffix, blacklist)
+
+def add_change_pct(df, ltp_data, key_suffix):
+    # Per-row part of build_option_chain (LTP, trigger, change %); rows are
+    # independent, so shards.py runs it inside each shard
+    if ltp_data is not None:
+        df['ltp'] = df['instrument_key'].map(ltp_data).fillna(0.0)
+    else:
+        df['ltp'] = 0.0
+
+    # If Intraday, replace Trigger with Camarilla_R4
+    if key_suffix == 'Intraday' and 'Camarilla_R4' in df.columns:
+        df['Trigger'] = df['Camarilla_R4']
+
+    # Calculate Change % (vectorised; 0 when Trigger or LTP is missing)
+    trigger = pd.to_numeric(df['Trigger'], errors='coerce').fillna(0.0).to_numpy(dtype=float)
+    ltp = pd.to_numeric(df['ltp'], errors='coerce').fillna(0.0).to_numpy(dtype=float)
+    valid = (trigger > 0) & (ltp > 0)
+    df['change %'] = np.where(valid, ltp / np.where(valid, trigger, 1.0) * 100, 0.0)
+    return df
+
+def rank_option_chain(df, key_suffix, blacklist=None):
+    # Whole-table part of build_option_chain: Intraday blacklist, colour band,
+    # split and sort. Returns (calls_df, puts_df, new_violators).
+
+    # --- Intraday Blacklist Logic ---
+    new_violators = set()
+    if key_suffix == 'Intraday':
+        blacklist = set(blacklist or ())
+
+        # Check time condition (before 09:30)
+        if get_ist_now().time() < BLACKLIST_CUTOFF:
+            # Identify new violators
+            violators = set(df.loc[df['change %'] >= 100, 'instrument_key'].tolist())
+            new_violators = violators - blacklist
+            blacklist |= violators
+
+        # Filter out blacklisted keys
+        if blacklist:
+            df = df[~df['instrument_key'].isin(blacklist)]
+
+    # Precomputed colour band so rendering needs no per-cell styling
+    change = df['change %'].to_numpy()
+    df = df.assign(Band=np.select([change >= 100, change >= 90], [BAND_STRONG, BAND_NEAR], default=''))
+
+    # Split Calls/Puts and Sort
+    calls_df = df[df['OptionType'] == 'CE'].sort_values(by='change %', ascending=False)
+    puts_df = df[df['OptionType'] == 'PE'].sort_values(by='change %', ascending=False)
+
+    return calls_df, puts_df, new_violators
@@ -0,0 +1,20 @@
+import multiprocessing.spawn
+
+# Entry module for shard workers (shards.py). The forkserver preloads it, so
+# every worker forks from a process that already has pandas, pyarrow and
+# scanner imported, and never from the app server.
+#
+# A child still runs the parent's __main__ before taking work (under
+# `streamlit run` that is app.py, under AppTest the test's script). Workers
+# only need shards, so that step is skipped here. This module is only ever
+# imported in the forkserver and its children, never in the server.
+
+
+def _skip_main(_):
+    pass
+
+
+multiprocessing.spawn._fixup_main_from_path = _skip_main
+multiprocessing.spawn._fixup_main_from_name = _skip_main
+
+import shards  # noqa: E402,F401
@@ -0,0 +1,263 @@
+import os
+import atexit
+import threading
+import multiprocessing
+import concurrent.futures
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import streamlit as st
+
+import scanner
+
+# Symbol-sharded ATM selection on a process pool (the bhavcopy half of
+# process_bhavcopy, which InstrumentMaster.atm_table runs on a cache miss).
+#
+# The parent parses the bhavcopy with pyarrow's multithreaded CSV reader,
+# picks the target expiry over the whole file, keeps only that expiry's rows
+# and splits them into shards of whole underlyings (contiguous symbol ranges
+# balanced by row count). Each shard goes to a worker as an Arrow IPC stream
+# in shared memory; the worker runs scanner.atm_rows_for_expiry and returns
+# its rows the same way. Nothing large is pickled.
+#
+# The merge is deterministic: shard results are collected in shard order and
+# put back into bhavcopy order, so the output matches the in-process path for
+# any worker count or completion order.
+#
+# The per-refresh steps (instrument join of the cached rows, LTP, change %)
+# stay in-process: they touch a few hundred ATM rows, well below the cost of a
+# process hop.
+#
+# SCANNER_WORKERS sets the pool size (default: all cores). The app only uses
+# the pool when SCANNER_WORKERS > 1 (see instruments.py).
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+WORKERS = int(os.environ.get('SCANNER_WORKERS', '0') or 0)
+
+_STRING_COLUMNS = ['FinInstrmTp', 'TckrSymb', 'XpryDt', 'OptnTp', 'FinInstrmNm']
+OPTION_KEY = ['TckrSymb', 'StrkPric', 'OptnTp']
+
+_pool = None
+_pool_workers = None
+_pool_lock = threading.Lock()
+
+
+def _mp_context():
+    # Workers fork from a forkserver that preloads shard_worker (see there),
+    # never from the multithreaded server and never re-running its __main__
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        # The forkserver starts with only its cwd on sys.path (3.11 drops the
+        # parent's), so make shard_worker importable from anywhere. Read by
+        # new interpreters only.
+        paths = os.environ.get('PYTHONPATH', '').split(os.pathsep)
+        if APP_DIR not in paths:
+            os.environ['PYTHONPATH'] = os.pathsep.join([APP_DIR] + [p for p in paths if p])
+        ctx = multiprocessing.get_context('forkserver')
+        ctx.set_forkserver_preload(['shard_worker'])
+        return ctx
+    return multiprocessing.get_context('spawn')
+
+
+# --- Arrow IPC through shared memory ---
+
+def _write_ipc(table, view):
+    # All Arrow references to the block are gone on return, so it can close
+    sink = pa.FixedSizeBufferWriter(pa.py_buffer(view))
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    sink.close()
+
+
+def _publish(table):
+    # Write a table into a new shared memory block; returns (name, size).
+    # The reader unlinks it.
+    mock = pa.MockOutputStream()
+    with pa.ipc.new_stream(mock, table.schema) as writer:
+        writer.write_table(table)
+    size = mock.size()
+    shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    try:
+        _write_ipc(table, shm.buf)
+    except BaseException:
+        shm.close()
+        shm.unlink()
+        raise
+    shm.close()
+    return shm.name, size
+
+
+def _read(ref, unlink=False):
+    # Arrow table from a shared memory block. The bytes are copied out once
+    # (a memcpy), so the block can be closed while the table lives on.
+    name, size = ref
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        data = pa.py_buffer(bytes(shm.buf[:size]))
+    finally:
+        shm.close()
+        if unlink:
+            shm.unlink()
+    return pa.ipc.open_stream(data).read_all()
+
+
+def _unlink(ref):
+    try:
+        shm = shared_memory.SharedMemory(name=ref[0])
+        shm.close()
+        shm.unlink()
+    except FileNotFoundError:
+        pass
+
+
+# --- Worker side ---
+
+def _ping(_):
+    return os.getpid()
+
+
+def _scan_shard(bhav_ref, target_expiry):
+    bhav = _read(bhav_ref).to_pandas()
+    out = scanner.atm_rows_for_expiry(bhav, target_expiry)
+    if out.empty:
+        return None
+    return _publish(pa.Table.from_pandas(out, preserve_index=False))
+
+
+# --- Parent side ---
+
+def get_pool(workers=None):
+    # Process-wide pool. The first start pays for the forkserver's imports
+    # (~1 s), which startup.py does before serving; workers fork from it.
+    global _pool, _pool_workers
+    workers = workers or WORKERS or os.cpu_count() or 1
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers, mp_context=_mp_context())
+            _pool_workers = workers
+        return _pool
+
+
+def warm(workers=None):
+    # Start every worker now (they import pandas/pyarrow/scanner once)
+    pool = get_pool(workers)
+    list(pool.map(_ping, range(_pool_workers)))
+
+
+def shutdown():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True, cancel_futures=True)
+            _pool = None
+
+
+atexit.register(shutdown)
+
+
+def _csv_header(bhav_file):
+    if isinstance(bhav_file, bytes):
+        line = bhav_file.split(b'\n', 1)[0]
+    else:
+        with open(bhav_file, 'rb') as f:
+            line = f.readline()
+    return [c.strip().strip('"') for c in line.decode('utf-8-sig').split(',')]
+
+
+def read_bhavcopy(bhav_file):
+    # The columns the pipeline uses, as an Arrow table (None if any required
+    # column is missing)
+    header = _csv_header(bhav_file)
+    if not all(col in header for col in scanner.BHAV_COLUMNS):
+        return None
+    columns = [c for c in scanner.BHAV_COLUMNS + ['FinInstrmNm'] if c in header]
+    source = pa.BufferReader(bhav_file) if isinstance(bhav_file, bytes) else bhav_file
+    return pacsv.read_csv(source, convert_options=pacsv.ConvertOptions(
+        include_columns=columns,
+        column_types={c: pa.string() for c in _STRING_COLUMNS if c in columns},
+    ))
+
+
+def partition(symbols, n_shards):
+    # Shard id per row: whole underlyings, contiguous in sorted symbol order,
+    # balanced by row count. Returns (row_shard, shard_symbols).
+    codes, uniques = pd.factorize(symbols, sort=True)
+    counts = np.bincount(codes, minlength=len(uniques))
+    starts = np.cumsum(counts) - counts
+    n_shards = max(1, min(n_shards, len(uniques)))
+    symbol_shard = np.minimum(starts * n_shards // max(len(symbols), 1), n_shards - 1)
+    shard_symbols = [uniques[symbol_shard == s] for s in range(n_shards)]
+    return symbol_shard[codes], shard_symbols
+
+
+def _run(bhav_file, target_expiry_index, workers, shards):
+    table = read_bhavcopy(bhav_file)
+    if table is None:
+        st.error(f"Uploaded file missing required columns: {scanner.BHAV_COLUMNS}")
+        return pd.DataFrame()
+
+    futures = table.filter(pc.is_in(table['FinInstrmTp'], value_set=pa.array(['STF', 'IDF'])))
+    target_expiry = scanner.pick_target_expiry(futures.to_pandas(), target_expiry_index)
+    if target_expiry is None:
+        return pd.DataFrame()
+    if pc.sum(pc.is_in(table['OptnTp'], value_set=pa.array(['CE', 'PE']))).as_py() in (None, 0):
+        st.warning("No Options data found in uploaded file.")
+        return pd.DataFrame()
+
+    # Only the target expiry's rows can match (see atm_rows_for_expiry), so
+    # the rest never leaves the parent
+    expiries = pc.unique(table['XpryDt'])
+    on_target = (pd.to_datetime(expiries.to_pandas()) == target_expiry).to_numpy()
+    table = table.filter(pc.is_in(table['XpryDt'], value_set=expiries.filter(pa.array(on_target))))
+
+    options = table.filter(pc.is_in(table['OptnTp'], value_set=pa.array(['CE', 'PE']))) \
+        .select(OPTION_KEY).to_pandas()
+
+    pool = get_pool(workers)
+    n_shards = shards or _pool_workers
+    row_shard, shard_symbols = partition(table['TckrSymb'].to_numpy(zero_copy_only=False), n_shards)
+    order = np.argsort(row_shard, kind='stable')
+    table = table.take(pa.array(order))
+    bounds = np.concatenate([[0], np.cumsum(np.bincount(row_shard, minlength=len(shard_symbols)))])
+
+    inputs, outputs = [], []
+    try:
+        futures_list = []
+        for s in range(len(shard_symbols)):
+            bhav_ref = _publish(table.slice(bounds[s], bounds[s + 1] - bounds[s]))
+            inputs.append(bhav_ref)
+            futures_list.append(pool.submit(_scan_shard, bhav_ref, target_expiry))
+        # Shard order, not completion order
+        for future in futures_list:
+            outputs.append(future.result())
+        tables = [_read(ref, unlink=True) for ref in outputs if ref is not None]
+        outputs = []
+    except concurrent.futures.process.BrokenProcessPool:
+        shutdown()
+        raise
+    finally:
+        for ref in inputs + [ref for ref in outputs if ref is not None]:
+            _unlink(ref)
+
+    if not tables:
+        return pd.DataFrame()
+    result = pa.concat_tables(tables, promote_options='permissive').to_pandas()
+    # Back into bhavcopy order, which is what the in-process path returns
+    position = options.assign(_row=np.arange(len(options))).drop_duplicates(OPTION_KEY)
+    result = result.merge(position, on=OPTION_KEY, how='left', sort=False)
+    return result.sort_values('_row', kind='stable').drop(columns='_row').reset_index(drop=True)
+
+
+def select_atm_rows(bhav_file, target_expiry_index=0, workers=None, shards=None):
+    # Sharded scanner.select_atm_rows
+    try:
+        return _run(bhav_file, target_expiry_index, workers, shards)
+    except Exception as e:
+        st.error(f"Error processing file: {e}")
+        return pd.DataFrame()
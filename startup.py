@@ -0,0 +1,216 @@
+import os
+import sys
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+# Boot-time warm-up and startup profile.
+#
+#   python startup.py [streamlit run options]   # warm up, then serve app.py
+#   python startup.py --warm-only                # warm up, print the profile
+#   python startup.py --report                   # print the last saved profile
+#
+# The warm-up runs in the server process before it accepts connections: it
+# imports the pipeline, loads the instrument index (from the saved artifact
+# when NSE.json is unchanged), builds the default view's ATM table and fetches
+# its LTPs, which also opens the quote API connections. The first session then
+# finds all of it cached. The other tabs and expiries are warmed in the
+# background once the server is up.
+#
+# Phases are timed from process start until the first session's first render
+# completes; the breakdown is printed to the server log and saved to
+# data/startup_profile.json. Without the launcher (plain `streamlit run`) the
+# profile covers the first render only.
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+PROFILE_PATH = os.path.join('data', 'startup_profile.json')
+
+
+def _process_age():
+    # Seconds since this process started (Linux); 0 elsewhere
+    try:
+        with open('/proc/self/stat') as f:
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return max(0.0, uptime - start_ticks / os.sysconf('SC_CLK_TCK'))
+    except (OSError, ValueError, IndexError):
+        return 0.0
+
+
+_origin = time.perf_counter() - _process_age()
+_phases = []             # (name, start_s, end_s) relative to process start
+_lock = threading.Lock()
+_warmed = False
+_first_render = None
+
+
+def elapsed():
+    return time.perf_counter() - _origin
+
+
+@contextmanager
+def phase(name):
+    # Time a startup phase; a no-op once the first render is done
+    if _first_render is not None:
+        yield
+        return
+    start = elapsed()
+    try:
+        yield
+    finally:
+        with _lock:
+            if _first_render is None:
+                _phases.append((name, start, elapsed()))
+
+
+def first_render_done(run_started):
+    # Called at the end of every script run; only the first one counts.
+    # run_started is the perf_counter() value when that run began.
+    global _first_render
+    if _first_render is not None:
+        return
+    with _lock:
+        if _first_render is not None:
+            return
+        _first_render = {
+            'session_started_s': run_started - _origin,
+            'render_s': time.perf_counter() - run_started,
+            'time_to_first_render_s': elapsed(),
+        }
+    write_report()
+    print(format_report(), flush=True)
+
+
+def report():
+    with _lock:
+        return {
+            'pid': os.getpid(),
+            'warmed': _warmed,
+            'phases': [{'name': n, 'start_s': round(s, 4), 'seconds': round(e - s, 4)} for n, s, e in _phases],
+            'first_render': _first_render,
+        }
+
+
+def write_report(path=PROFILE_PATH):
+    try:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(report(), f, indent=2)
+    except OSError:
+        pass
+
+
+def format_report(data=None):
+    data = data or report()
+    lines = [f"Startup profile (pid {data['pid']}, {'warmed' if data['warmed'] else 'no warm-up'})"]
+    for p in data['phases']:
+        lines.append(f"  {p['name']:<32} at {p['start_s']:7.3f} s  took {p['seconds'] * 1000:9.1f} ms")
+    first = data['first_render']
+    if first:
+        lines.append(f"  {'first session connected':<32} at {first['session_started_s']:7.3f} s")
+        lines.append(f"  {'first render':<32} took {first['render_s'] * 1000:9.1f} ms")
+        lines.append(f"  time to first render: {first['time_to_first_render_s']:.3f} s after process start")
+    return '\n'.join(lines)
+
+
+def _credentials():
+    # Same sources as app.py: secrets (client view), else the saved token
+    import streamlit as st
+    token = ''
+    try:
+        token = st.secrets.get('UPSTOX_ACCESS_TOKEN', '').strip()
+        if st.secrets.get('DHAN_ACCESS_TOKEN', '').strip():
+            import quotes
+            quotes.configure_dhan(st.secrets.get('DHAN_CLIENT_ID', ''), st.secrets['DHAN_ACCESS_TOKEN'])
+    except Exception:
+        pass
+    if not token:
+        from scanner import load_token
+        token = load_token()
+    return token
+
+
+# What a new session renders first: (tab, expiry index)
+DEFAULT_VIEW = ('Monthly', 0)
+EXPIRY_INDEXES = (0, 1)
+
+
+def _warm_views(master, views, token, label=''):
+    import scanner
+    keys = set()
+    for tab, expiry_index in views:
+        if not scanner.bhavcopy_info(tab):
+            continue
+        with phase(f"ATM table {tab}/{expiry_index}{label}"):
+            df = master.atm_table(tab, expiry_index)
+        if not df.empty:
+            keys.update(df['instrument_key'].dropna())
+    if token and keys:
+        with phase(f"quote cache ({len(keys)} keys){label}"):
+            scanner.resolve_ltp(sorted(keys), token)
+
+
+def warm_up(background=True, prime_quotes=True):
+    # Warm the default view now; the remaining views in a background thread
+    # (or inline with background=False)
+    global _warmed
+    with phase('import pipeline'):
+        import scanner
+        import instruments
+        import delta_table  # noqa: F401
+        import results_api  # noqa: F401
+    if instruments.SHARDED:
+        with phase('shard workers'):
+            import shards
+            shards.warm()
+    with phase('credentials'):
+        token = _credentials() if prime_quotes else ''
+    with phase('instrument index'):
+        master = instruments.get_master(scanner.NSE_JSON_PATH)
+        master.sync()
+    if master.empty:
+        return
+
+    _warm_views(master, [DEFAULT_VIEW], token)
+    _warmed = True
+
+    rest = [(tab, i) for tab in scanner.TABS for i in EXPIRY_INDEXES if (tab, i) != DEFAULT_VIEW]
+    if background:
+        threading.Thread(target=_warm_views, args=(master, rest, token, ' (background)'),
+                         name='warm-up', daemon=True).start()
+    else:
+        _warm_views(master, rest, token)
+
+
+def main():
+    args = sys.argv[1:]
+    if '--report' in args:
+        with open(PROFILE_PATH) as f:
+            print(format_report(json.load(f)))
+        return
+
+    sys.path.insert(0, APP_DIR)
+    # st.error/st.warning outside a running app only log
+    from streamlit import logger as st_logger
+    st_logger.set_log_level('error')
+    warm_only = '--warm-only' in args
+    with phase('warm-up'):
+        warm_up(background=not warm_only)
+    print(format_report(), flush=True)
+    if warm_only:
+        write_report()
+        return
+    st_logger.set_log_level('info')
+
+    # Serve from this process, so the app sees everything warmed above
+    from streamlit.web import cli
+    sys.argv = ['streamlit', 'run', os.path.join(APP_DIR, 'app.py')] + args
+    sys.exit(cli.main())
+
+
+if __name__ == "__main__":
+    # Run as the `startup` module so app.py's `import startup` shares its state
+    import startup
+    startup.main()
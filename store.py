@@ -0,0 +1,291 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+
+# Transactional state store (SQLite, WAL mode) shared by every session and
+# process. Replaces the data/*.json files and per-tab CSVs, which were read and
+# rewritten whole on every update. Writes are row-level upserts, so they cost
+# O(changed keys) and concurrent writers no longer lose each other's updates.
+#
+#   meta       key -> value
+#   token      day -> access token          (date-scoped)
+#   blacklist  (day, instrument_key)        (date-scoped)
+#   ltp        instrument_key -> price, updated_at
+#   bhavcopy   tab -> csv name, content, uploaded_at
+#
+# Date-scoped rows are only ever read for the current IST day and are purged
+# once per day. Existing data/*.json and data/*.csv files are imported the
+# first time the store is opened.
+
+DATA_DIR = 'data'
+DB_PATH = os.path.join(DATA_DIR, 'state.db')
+
+# Legacy file layout (imported once by migrate_legacy_files)
+BLACKLIST_FILE = os.path.join(DATA_DIR, 'blacklist.json')
+TOKEN_FILE = os.path.join(DATA_DIR, 'token.json')
+META_FILE = os.path.join(DATA_DIR, 'meta.json')
+LTP_CACHE_FILE = os.path.join(DATA_DIR, 'ltp_cache.json')
+
+FILES = {
+    'Monthly': os.path.join(DATA_DIR, 'monthly.csv'),
+    'Weekly': os.path.join(DATA_DIR, 'weekly.csv'),
+    'Intraday': os.path.join(DATA_DIR, 'intraday.csv')
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS token (
+    day TEXT PRIMARY KEY,
+    token TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS blacklist (
+    day TEXT NOT NULL,
+    instrument_key TEXT NOT NULL,
+    PRIMARY KEY (day, instrument_key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS ltp (
+    instrument_key TEXT PRIMARY KEY,
+    price REAL,
+    updated_at REAL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS bhavcopy (
+    tab TEXT PRIMARY KEY,
+    name TEXT,
+    content BLOB NOT NULL,
+    uploaded_at REAL
+);
+"""
+
+# Internal bookkeeping keys in meta (not returned by get_meta)
+_MIGRATED_KEY = '_migrated_legacy_files'
+
+_lock = threading.RLock()
+_conn = None
+_conn_path = None
+_purged_day = None
+
+
+def connect(path=None):
+    # One shared connection per process; sqlite3 serialises access within the
+    # process and WAL lets other processes read while one writes.
+    global _conn, _conn_path
+    path = path or DB_PATH
+    with _lock:
+        if _conn is None or _conn_path != path:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+            try:
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.execute('PRAGMA synchronous=NORMAL')
+                conn.executescript(SCHEMA)
+                migrate_legacy_files(conn)
+            except:
+                # Not cached, so the next connect() retries (e.g. the migration
+                # after a busy timeout)
+                conn.close()
+                raise
+            _conn, _conn_path = conn, path
+        return _conn
+
+
+def close():
+    global _conn, _conn_path
+    with _lock:
+        if _conn is not None:
+            _conn.close()
+        _conn, _conn_path = None, None
+
+
+class _Transaction:
+    # BEGIN IMMEDIATE ... COMMIT/ROLLBACK under the process lock
+    def __enter__(self):
+        _lock.acquire()
+        try:
+            self.conn = connect()
+            self.conn.execute('BEGIN IMMEDIATE')
+        except:
+            # __exit__ won't run; don't leave the lock held
+            _lock.release()
+            raise
+        return self.conn
+
+    def __exit__(self, exc_type, *exc):
+        try:
+            self.conn.execute('ROLLBACK' if exc_type else 'COMMIT')
+        finally:
+            _lock.release()
+
+
+def transaction():
+    return _Transaction()
+
+
+def _query(sql, params=()):
+    with _lock:
+        return connect().execute(sql, params).fetchall()
+
+
+def expire(day):
+    # Drop date-scoped rows from previous days (once per day per process)
+    global _purged_day
+    if _purged_day == day:
+        return
+    with transaction() as conn:
+        conn.execute('DELETE FROM token WHERE day <> ?', (day,))
+        conn.execute('DELETE FROM blacklist WHERE day <> ?', (day,))
+    _purged_day = day
+
+
+# --- meta ---
+
+def get_meta():
+    return {k: v for k, v in _query('SELECT key, value FROM meta') if not k.startswith('_')}
+
+
+def set_meta(key, value):
+    with transaction() as conn:
+        conn.execute('INSERT INTO meta (key, value) VALUES (?, ?) '
+                     'ON CONFLICT(key) DO UPDATE SET value = excluded.value', (key, value))
+
+
+# --- token ---
+
+def get_token(day):
+    expire(day)
+    rows = _query('SELECT token FROM token WHERE day = ?', (day,))
+    return rows[0][0] if rows else ''
+
+
+def set_token(day, token):
+    with transaction() as conn:
+        conn.execute('INSERT INTO token (day, token) VALUES (?, ?) '
+                     'ON CONFLICT(day) DO UPDATE SET token = excluded.token', (day, token))
+
+
+# --- blacklist ---
+
+def get_blacklist(day):
+    expire(day)
+    return {k for (k,) in _query('SELECT instrument_key FROM blacklist WHERE day = ?', (day,))}
+
+
+def add_blacklist(day, keys):
+    keys = list(keys)
+    if not keys:
+        return
+    with transaction() as conn:
+        conn.executemany('INSERT OR IGNORE INTO blacklist (day, instrument_key) VALUES (?, ?)',
+                         [(day, k) for k in keys])
+
+
+# --- ltp ---
+
+def get_ltps(keys=None, max_age=None):
+    # Latest cached price per key (all keys when keys is None); with max_age,
+    # only prices updated within the last max_age seconds
+    since = time.time() - max_age if max_age is not None else 0
+    if keys is None:
+        return dict(_query('SELECT instrument_key, price FROM ltp WHERE updated_at >= ?', (since,)))
+    keys = list(keys)
+    result = {}
+    # Stay under SQLite's bound-parameter limit
+    for i in range(0, len(keys), 500):
+        chunk = keys[i:i + 500]
+        marks = ','.join('?' * len(chunk))
+        result.update(_query(f'SELECT instrument_key, price FROM ltp WHERE instrument_key IN ({marks}) '
+                             'AND updated_at >= ?', chunk + [since]))
+    return result
+
+
+def upsert_ltps(prices):
+    if not prices:
+        return
+    now = time.time()
+    with transaction() as conn:
+        conn.executemany('INSERT INTO ltp (instrument_key, price, updated_at) VALUES (?, ?, ?) '
+                         'ON CONFLICT(instrument_key) DO UPDATE SET '
+                         'price = excluded.price, updated_at = excluded.updated_at',
+                         [(k, v, now) for k, v in prices.items()])
+
+
+# --- bhavcopy ---
+
+def get_bhavcopy_info(tab):
+    # (name, uploaded_at) without loading the content, or None
+    rows = _query('SELECT name, uploaded_at FROM bhavcopy WHERE tab = ?', (tab,))
+    return rows[0] if rows else None
+
+
+def get_bhavcopy(tab):
+    # Raw CSV bytes, or None
+    rows = _query('SELECT content FROM bhavcopy WHERE tab = ?', (tab,))
+    return bytes(rows[0][0]) if rows else None
+
+
+def put_bhavcopy(tab, name, content, uploaded_at=None):
+    with transaction() as conn:
+        conn.execute('INSERT INTO bhavcopy (tab, name, content, uploaded_at) VALUES (?, ?, ?, ?) '
+                     'ON CONFLICT(tab) DO UPDATE SET name = excluded.name, '
+                     'content = excluded.content, uploaded_at = excluded.uploaded_at',
+                     (tab, name, sqlite3.Binary(content), uploaded_at or time.time()))
+
+
+# --- one-time migration ---
+
+def _read_json(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except:
+        return None
+
+
+def migrate_legacy_files(conn):
+    # Import data/*.json and data/*.csv into the store, once. The old files
+    # are left in place (and ignored from then on).
+    if conn.execute('SELECT 1 FROM meta WHERE key = ?', (_MIGRATED_KEY,)).fetchall():
+        return
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        # Another process may have finished the migration while we waited
+        if conn.execute('SELECT 1 FROM meta WHERE key = ?', (_MIGRATED_KEY,)).fetchall():
+            conn.execute('COMMIT')
+            return
+
+        meta = _read_json(META_FILE) or {}
+        conn.executemany('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                         [(k, str(v)) for k, v in meta.items()])
+
+        token = _read_json(TOKEN_FILE) or {}
+        if token.get('date') and token.get('token'):
+            conn.execute('INSERT OR REPLACE INTO token (day, token) VALUES (?, ?)',
+                         (token['date'], token['token']))
+
+        blacklist = _read_json(BLACKLIST_FILE) or {}
+        if blacklist.get('date'):
+            conn.executemany('INSERT OR IGNORE INTO blacklist (day, instrument_key) VALUES (?, ?)',
+                             [(blacklist['date'], k) for k in blacklist.get('keys', [])])
+
+        ltp_cache = _read_json(LTP_CACHE_FILE) or {}
+        # Stamped with the file's age, so old prices never count as fresh
+        cached_at = os.path.getmtime(LTP_CACHE_FILE) if ltp_cache else 0
+        conn.executemany('INSERT OR REPLACE INTO ltp (instrument_key, price, updated_at) VALUES (?, ?, ?)',
+                         [(k, v, cached_at) for k, v in ltp_cache.items()])
+
+        for tab, path in FILES.items():
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    content = f.read()
+                conn.execute('INSERT OR REPLACE INTO bhavcopy (tab, name, content, uploaded_at) VALUES (?, ?, ?, ?)',
+                             (tab, os.path.basename(path), sqlite3.Binary(content), os.path.getmtime(path)))
+
+        conn.execute('INSERT INTO meta (key, value) VALUES (?, ?)', (_MIGRATED_KEY, str(time.time())))
+        conn.execute('COMMIT')
+    except:
+        conn.execute('ROLLBACK')
+        raise
@@ -0,0 +1,198 @@
+import os
+import json
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows: in-process locking only
+    fcntl = None
+
+from scanner import DATA_DIR, IST, get_ist_now
+
+# Append-only intraday LTP history, one directory per IST trading day:
+#
+#   data/ticks/2026-01-29/key.i32   int32   key id (see keys.json)
+#   data/ticks/2026-01-29/ts.u32    uint32  epoch seconds
+#   data/ticks/2026-01-29/px.f32    float32 last traded price
+#   data/ticks/2026-01-29/keys.json instrument_key list, index == key id
+#
+# Each column is a flat little-endian file, so a day can be np.memmap'ed and
+# range-queried without parsing. Appends only ever write to the end of the
+# three files; a crash mid-append is repaired on read by truncating to the
+# shortest column, and on the next append by cutting the files back to it.
+
+TICKS_DIR = os.path.join(DATA_DIR, 'ticks')
+
+COLUMNS = (
+    ('key', 'key.i32', np.dtype('<i4')),
+    ('ts', 'ts.u32', np.dtype('<u4')),
+    ('px', 'px.f32', np.dtype('<f4')),
+)
+
+_lock = threading.Lock()
+_key_ids = {}      # day -> {instrument_key: id}
+_last_price = {}   # day -> {instrument_key: last appended price} (skip unchanged)
+
+
+def day_dir(day):
+    return os.path.join(TICKS_DIR, day)
+
+
+def list_days():
+    if not os.path.isdir(TICKS_DIR):
+        return []
+    return sorted(d for d in os.listdir(TICKS_DIR) if os.path.isdir(day_dir(d)))
+
+
+def _load_keys(day):
+    path = os.path.join(day_dir(day), 'keys.json')
+    if os.path.exists(path):
+        try:
+            with open(path, 'r') as f:
+                return json.load(f)
+        except:
+            pass
+    return []
+
+
+def _key_map(day):
+    if day not in _key_ids:
+        _key_ids[day] = {k: i for i, k in enumerate(_load_keys(day))}
+    return _key_ids[day]
+
+
+def _save_keys(day, key_map):
+    keys = sorted(key_map, key=key_map.get)
+    tmp = os.path.join(day_dir(day), 'keys.json.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(keys, f)
+    os.replace(tmp, os.path.join(day_dir(day), 'keys.json'))
+
+
+class _FileLock:
+    # Cross-process append lock (no-op where fcntl is unavailable)
+    def __init__(self, day):
+        self.path = os.path.join(day_dir(day), '.lock')
+
+    def __enter__(self):
+        self.f = open(self.path, 'a')
+        if fcntl:
+            fcntl.flock(self.f, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl:
+            fcntl.flock(self.f, fcntl.LOCK_UN)
+        self.f.close()
+
+
+def append_ticks(prices, ts=None, skip_unchanged=True):
+    # prices: {instrument_key: ltp}. Returns the number of ticks written.
+    # ts defaults to now; it is taken under the file lock so that concurrent
+    # writers still append in non-decreasing time order.
+    day = (ts or get_ist_now()).strftime('%Y-%m-%d')
+
+    with _lock:
+        last = _last_price.setdefault(day, {})
+        if skip_unchanged:
+            prices = {k: v for k, v in prices.items() if v is not None and last.get(k) != v}
+        else:
+            prices = {k: v for k, v in prices.items() if v is not None}
+        if not prices:
+            return 0
+
+        os.makedirs(day_dir(day), exist_ok=True)
+        with _FileLock(day):
+            # Another process may have registered keys since we last looked
+            key_map = {k: i for i, k in enumerate(_load_keys(day))}
+            new_keys = [k for k in prices if k not in key_map]
+            for k in new_keys:
+                key_map[k] = len(key_map)
+            if new_keys:
+                _save_keys(day, key_map)
+            _key_ids[day] = key_map
+            epoch = int((ts or get_ist_now()).timestamp())
+
+            # Cut a torn earlier append back to the last whole row, so this
+            # one starts aligned in all three columns
+            paths = [os.path.join(day_dir(day), filename) for _, filename, _ in COLUMNS]
+            sizes = [os.path.getsize(p) if os.path.exists(p) else 0 for p in paths]
+            rows = min(size // dtype.itemsize for size, (_, _, dtype) in zip(sizes, COLUMNS))
+            for path, size, (_, _, dtype) in zip(paths, sizes, COLUMNS):
+                if size != rows * dtype.itemsize:
+                    os.truncate(path, rows * dtype.itemsize)
+
+            values = {
+                'key': np.fromiter((key_map[k] for k in prices), dtype='<i4', count=len(prices)),
+                'ts': np.full(len(prices), epoch, dtype='<u4'),
+                'px': np.fromiter(prices.values(), dtype='<f4', count=len(prices)),
+            }
+            for path, (name, _, _) in zip(paths, COLUMNS):
+                with open(path, 'ab') as f:
+                    f.write(values[name].tobytes())
+
+        last.update(prices)
+    return len(prices)
+
+
+def open_day(day):
+    # Memory-mapped (key, ts, px) arrays for a day, or None if nothing recorded
+    paths = [os.path.join(day_dir(day), filename) for _, filename, _ in COLUMNS]
+    if not all(os.path.exists(p) for p in paths):
+        return None
+    n = min(os.path.getsize(p) // dtype.itemsize for p, (_, _, dtype) in zip(paths, COLUMNS))
+    if n == 0:
+        return None
+    return {
+        name: np.memmap(p, dtype=dtype, mode='r', shape=(n,))
+        for p, (name, _, dtype) in zip(paths, COLUMNS)
+    }
+
+
+def _to_epoch(value):
+    if value is None or isinstance(value, (int, float)):
+        return value
+    if isinstance(value, datetime) and value.tzinfo is None:
+        value = value.replace(tzinfo=IST)
+    return int(value.timestamp())
+
+
+def query_ticks(instrument_key, day=None, start=None, end=None):
+    # Ticks for one contract as a DataFrame (ts [IST], price), start/end
+    # inclusive. Ticks are appended in time order, so the time window is a
+    # binary search and only the key filter scans the window.
+    day = day or get_ist_now().strftime('%Y-%m-%d')
+    cols = open_day(day)
+    key_id = _key_map(day).get(instrument_key)
+    if key_id is None:
+        _key_ids.pop(day, None)
+        key_id = _key_map(day).get(instrument_key)
+    if cols is None or key_id is None:
+        return pd.DataFrame({'ts': pd.Series(dtype='datetime64[s, Asia/Kolkata]'), 'price': pd.Series(dtype='float32')})
+
+    lo = 0 if start is None else int(np.searchsorted(cols['ts'], _to_epoch(start), side='left'))
+    hi = len(cols['ts']) if end is None else int(np.searchsorted(cols['ts'], _to_epoch(end), side='right'))
+    mask = cols['key'][lo:hi] == key_id
+    ts = np.asarray(cols['ts'][lo:hi][mask], dtype='int64')
+    return pd.DataFrame({
+        'ts': pd.to_datetime(ts, unit='s', utc=True).tz_convert('Asia/Kolkata'),
+        'price': np.asarray(cols['px'][lo:hi][mask]),
+    })
+
+
+def read_day(day):
+    # All ticks for a day as a DataFrame (ts epoch seconds, instrument_key, price),
+    # in recorded order.
+    cols = open_day(day)
+    if cols is None:
+        return pd.DataFrame(columns=['ts', 'instrument_key', 'price'])
+    keys = np.array(_load_keys(day), dtype=object)
+    return pd.DataFrame({
+        'ts': np.asarray(cols['ts'], dtype='int64'),
+        'instrument_key': keys[np.asarray(cols['key'])],
+        'price': np.asarray(cols['px'], dtype='float64'),
+    })